@@ -0,0 +1,57 @@
+# Lists the coursework of many courses through iter_batched against a fake
+# Classroom API that rate limits every sub-request past the first
+# `batch_limit` of a batch, over several invocations of one container.
+# Compares one unbounded batch without retries (the old behaviour) with
+# batch.execute's adaptive chunking and retries, reporting how much of
+# the coursework came back, the calls the API served and the batch size the
+# container settled on.
+#
+#   python benchmarks/adaptive_batching.py [courses] [batch_limit]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+
+from app import batch, service  # noqa: E402
+from app.classroom import GRADE_COURSE_WORK_FIELDS, fetch_course_works  # noqa: E402
+from fake_classroom import FakeClassroom  # noqa: E402
+
+INVOCATIONS = 4
+COURSE_WORKS = 5
+
+
+def run(name, classroom, course_ids):
+    for _ in range(INVOCATIONS):
+        calls = sum(classroom.calls.values())
+        start = time.perf_counter()
+        course_works = fetch_course_works(
+            service.get_service(Credentials("token")), course_ids, GRADE_COURSE_WORK_FIELDS)
+        elapsed = time.perf_counter() - start
+        print("{:<10} {:>4}/{} coursework  {:>4} calls served  {:.3f}s  batch size {}".format(
+            name, len(course_works), len(course_ids) * COURSE_WORKS,
+            sum(classroom.calls.values()) - calls, elapsed, batch.batch_size.value))
+
+
+def main():
+    courses = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    batch_limit = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    classroom = FakeClassroom(courses=courses, course_works=COURSE_WORKS, announcements=0,
+                              latency=0.02, batch_limit=batch_limit)
+    service.build_http = classroom.http
+    course_ids = [course["id"] for course in classroom.courses]
+
+    adaptive, max_attempts = batch.batch_size, batch.MAX_ATTEMPTS
+    batch.batch_size = batch._AdaptiveSize(courses, courses, 0)
+    batch.MAX_ATTEMPTS = 1
+    run("unbounded", classroom, course_ids)
+    batch.batch_size, batch.MAX_ATTEMPTS = adaptive, max_attempts
+    run("adaptive", classroom, course_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Runs every Alexa.Education handler against the fake Classroom API served
+# over local HTTP, once on the synchronous engine (httplib2 and batch
+# requests) and once on the asyncio engine in app.aio, and checks both
+# produce the same payload. Needs aiohttp.
+#
+#   python benchmarks/async_engine.py [latency_seconds]
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+
+from fake_classroom import STUDENT_ID, FakeClassroom, serve  # noqa: E402
+
+
+def requests(education):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    window = {"start": (now - datetime.timedelta(days=7)).isoformat(),
+              "end": (now + datetime.timedelta(days=7)).isoformat()}
+    page = {"maxResults": 50}
+    return [
+        (education.STUDENT_PROFILE_NAMESPACE, {}),
+        (education.COURSE_NAMESPACE, {"query": {"matchAll": {"studentId": STUDENT_ID}},
+                                      "paginationContext": page}),
+        (education.COURSEWORK_NAMESPACE, {"query": {"matchAll": {
+            "studentId": STUDENT_ID, "dueTime": window}}, "paginationContext": page}),
+        (education.COURSE_WORK_GRADE_NAMESPACE, {
+            "query": {"matchAll": {"studentId": STUDENT_ID}}, "paginationContext": page}),
+        (education.ANNOUNCEMENTS_NAMESPACE, {
+            "query": {"matchAll": {"studentId": STUDENT_ID}}, "paginationContext": page}),
+    ]
+
+
+def run(modules, handler, request, creds):
+    from app.cache import ResponseCache
+
+    # Every module holding the cache gets the same fresh one, so each run
+    # starts cold
+    cache = ResponseCache()
+    for module in modules:
+        module.response_cache = cache
+    start = time.perf_counter()
+    response = handler(request, creds, None)
+    elapsed = time.perf_counter() - start
+    del response["response"]["header"]["messageId"]
+    return elapsed, response
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    classroom = FakeClassroom(courses=10, course_works=30, announcements=15, latency=latency)
+    server = serve(classroom)
+    os.environ["CLASSROOM_API_ROOT"] = "http://127.0.0.1:{}/".format(server.server_address[1])
+
+    from google.oauth2.credentials import Credentials
+    from app import aio, announcement_feed, education
+
+    modules = (education, announcement_feed, aio)
+    creds = Credentials("token")
+    # Warm both engines first (imports, the event loop and the session)
+    # so the first namespace is not charged for them
+    namespace, request = requests(education)[0]
+    run(modules, education.HANDLER_MAP[namespace], request, creds)
+    run(modules, lambda *args: aio.run(namespace, *args), request, creds)
+
+    for namespace, request in requests(education):
+        classroom.http_requests = 0
+        before, expected = run(modules, education.HANDLER_MAP[namespace], request, creds)
+        sync_requests = classroom.http_requests
+
+        classroom.http_requests = 0
+        after, actual = run(modules, lambda *args: aio.run(namespace, *args), request, creds)
+        assert actual == expected, "{}: the async engine changed the response".format(namespace)
+        print("{:<50} sync {:>7.3f}s ({:>3} calls)  async {:>7.3f}s ({:>3} calls)".format(
+            namespace, before, sync_requests, after, classroom.http_requests))
+    aio._loop.run_until_complete(aio._session.close())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Fires the same Alexa.Education request from several threads at once, as
+# a household routine does across devices, against the fake Classroom API
+# with a cold response cache, and counts the API calls made. Without the
+# single-flight layer every request fetches for itself; with it the burst
+# should cost what one request does.
+#
+#   python benchmarks/coalescing.py [requests] [latency_seconds]
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+
+from load_test import synthetic_events  # noqa: E402
+from fake_classroom import FakeClassroom  # noqa: E402
+
+
+def burst(education, event, count):
+    responses = [None] * count
+
+    def invoke(i):
+        response = education.handler(event, None)
+        del response["response"]["header"]["messageId"]
+        responses[i] = response
+
+    threads = [threading.Thread(target=invoke, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    classroom = FakeClassroom(courses=10, course_works=30, latency=latency)
+
+    from app import announcement_feed, education, service, singleflight
+    from app.cache import ResponseCache
+
+    service.build_http = classroom.http
+    for event in synthetic_events()[1:]:
+        calls = {}
+        for name, flights in (("uncoalesced", None), ("coalesced", singleflight.SingleFlight())):
+            education.flights = flights or _Direct()
+            education.response_cache = announcement_feed.response_cache = ResponseCache()
+            before = sum(classroom.calls.values())
+            responses = burst(education, event, count)
+            assert all(response == responses[0] for response in responses)
+            calls[name] = sum(classroom.calls.values()) - before
+        print("{:<40} {} requests: {:>4} API calls uncoalesced, {:>4} coalesced".format(
+            event["request"]["header"]["namespace"], count, calls["uncoalesced"],
+            calls["coalesced"]))
+
+
+class _Direct:
+    # The single-flight interface without the coalescing
+    @staticmethod
+    def do(parts, fetch, *args, **kwargs):
+        return fetch(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
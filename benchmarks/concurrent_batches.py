@@ -0,0 +1,67 @@
+# Runs coursework_handler and coursework_grade_handler against the fake
+# Classroom API with an artificial per-round-trip latency, once with the
+# batches executed one after the other and once through
+# run_concurrently, and checks both produce the same payload.
+#
+#   python benchmarks/concurrent_batches.py [latency_seconds]
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+
+from app import education, service  # noqa: E402
+from app.cache import ResponseCache  # noqa: E402
+from fake_classroom import STUDENT_ID, FakeClassroom  # noqa: E402
+
+
+def sequential(creds, *fetches):
+    return [fetch() for fetch in fetches]
+
+
+def coursework_request():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "query": {"matchAll": {"studentId": STUDENT_ID, "dueTime": {
+            "start": (now - datetime.timedelta(days=7)).isoformat(),
+            "end": (now + datetime.timedelta(days=7)).isoformat()}}},
+        "paginationContext": {"maxResults": 50},
+    }
+
+
+def grade_request():
+    return {"query": {"matchAll": {"studentId": STUDENT_ID}},
+            "paginationContext": {"maxResults": 50}}
+
+
+def run(handler, request, executor):
+    education.run_concurrently = executor
+    education.response_cache = ResponseCache()
+    start = time.perf_counter()
+    response = handler(request, Credentials("token"), None)
+    elapsed = time.perf_counter() - start
+    del response["response"]["header"]["messageId"]
+    return elapsed, response
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    classroom = FakeClassroom(courses=10, course_works=30, latency=latency)
+    service.build_http = classroom.http
+    concurrent = education.run_concurrently
+
+    for handler, request in ((education.coursework_handler, coursework_request()),
+                             (education.coursework_grade_handler, grade_request())):
+        before, expected = run(handler, request, sequential)
+        after, actual = run(handler, request, concurrent)
+        assert actual == expected, "concurrent execution changed the response"
+        print("{:<26} sequential {:>7.3f}s  concurrent {:>7.3f}s  ratio {:.2f}".format(
+            handler.__name__, before, after, after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Runs the Alexa.Education handlers several times in one process, as a
+# warm container would, against the fake Classroom API served over local
+# TLS, and counts the connections the server accepts per invocation. With
+# a fresh transport per service every invocation pays new handshakes; with
+# the shared pool in app.service only the first one should. The
+# certificate is generated with the openssl command line tool.
+#
+#   python benchmarks/connection_reuse.py [invocations]
+import datetime
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+import httplib2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+
+from fake_classroom import STUDENT_ID, FakeClassroom, serve  # noqa: E402
+
+
+def certificate(directory):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+def requests(education):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    window = {"start": (now - datetime.timedelta(days=7)).isoformat(),
+              "end": (now + datetime.timedelta(days=7)).isoformat()}
+    query = {"query": {"matchAll": {"studentId": STUDENT_ID}},
+             "paginationContext": {"maxResults": 20}}
+    return [
+        (education.student_profile_handler, {}),
+        (education.course_handler, query),
+        (education.coursework_handler, {"query": {"matchAll": {
+            "studentId": STUDENT_ID, "dueTime": window}}, "paginationContext": {"maxResults": 20}}),
+        (education.coursework_grade_handler, query),
+        (education.announcements_handler, query),
+    ]
+
+
+def invoke(server, modules, requests, creds):
+    from app.cache import ResponseCache
+
+    # A cold response cache, so every invocation goes to the API
+    cache = ResponseCache()
+    for module in modules:
+        module.response_cache = cache
+    connections = server.connections
+    start = time.perf_counter()
+    for handler, request in requests:
+        handler(request, creds, None)
+    return server.connections - connections, time.perf_counter() - start
+
+
+def main():
+    invocations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = certificate(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server = serve(FakeClassroom(courses=10, course_works=30), ssl_context=context)
+        os.environ["CLASSROOM_API_ROOT"] = "https://127.0.0.1:{}/".format(
+            server.server_address[1])
+
+        from google.oauth2.credentials import Credentials
+        from app import announcement_feed, education, service
+
+        service.build_http = lambda: httplib2.Http(ca_certs=cert)
+        modules = (education, announcement_feed)
+        creds = Credentials("token")
+
+        # A new transport for every authorized_http() call, as before the
+        # pool, against the shared one
+        shared_http = service.shared_http
+        results = {}
+        for name, transport in (("unpooled", lambda: service.PooledHttp()),
+                                ("pooled", shared_http)):
+            service.shared_http = transport
+            results[name] = []
+            for _ in range(invocations):
+                results[name].append(invoke(server, modules, requests(education), creds))
+            print("{:<15} connections per invocation {}   {:.3f}s total".format(
+                name, [connections for connections, _ in results[name]],
+                sum(elapsed for _, elapsed in results[name])))
+
+        pooled = [connections for connections, _ in results["pooled"]]
+        assert not any(pooled[1:]), "warm invocations opened new connections"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Sends the custom skill's events through one get_handler(), as a warm
+# container would, against moto's DynamoDB and the fake Classroom API. It
+# counts the DynamoDB clients created and the operations called by the
+# skill's persistence adapter and by UserMapping, and checks that the
+# request path sets the skill up once and never describes or creates a
+# table. Needs moto, ask-sdk and the pinned pynamodb/botocore from
+# requirements.txt.
+#
+#   python benchmarks/custom_skill.py [rounds]
+import collections
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.pop("DYNAMODB_HOST", None)
+
+import boto3  # noqa: E402
+
+from fake_classroom import FakeClassroom  # noqa: E402
+
+try:
+    from moto import mock_aws as mock_dynamodb
+except ImportError:
+    from moto import mock_dynamodb2 as mock_dynamodb
+
+ALEXA_USER_ID = "amzn1.ask.account.TEST"
+NOTIFICATIONS = {"scope": "alexa::devices:all:notifications:write"}
+
+
+def event(request_type, body=None):
+    request = {"type": request_type, "requestId": "amzn1.ask.request." + str(uuid.uuid4()),
+               "timestamp": "2026-01-01T00:00:00Z", "locale": "en-US"}
+    if body is not None:
+        request["body"] = body
+    return {
+        "version": "1.0",
+        "context": {"System": {
+            "application": {"applicationId": "amzn1.ask.skill.TEST"},
+            "user": {"userId": ALEXA_USER_ID, "accessToken": "token"},
+            "apiEndpoint": "https://api.amazonalexa.com",
+        }},
+        "request": request,
+    }
+
+
+def events():
+    # Linking, a repeat of it, the two informational events and revoking
+    return [
+        event("AlexaSkillEvent.SkillPermissionAccepted", {"acceptedPermissions": [NOTIFICATIONS]}),
+        event("AlexaSkillEvent.SkillPermissionChanged", {"acceptedPermissions": [NOTIFICATIONS]}),
+        event("AlexaSkillEvent.ProactiveSubscriptionChanged", {}),
+        event("AlexaSkillEvent.SkillAccountLinked", {}),
+        event("AlexaSkillEvent.SkillPermissionChanged", {"acceptedPermissions": []}),
+    ]
+
+
+def count_calls(emitter, label, calls):
+    # Clients copy their session's handlers when they are created, so this
+    # sees every client made from the session afterwards. pynamodb sends
+    # its requests itself but still emits before-send.
+    def created(**kwargs):
+        calls[label, "client"] += 1
+
+    def sent(event_name, **kwargs):
+        calls[label, event_name.rsplit(".", 1)[-1]] += 1
+    emitter.register("creating-client-class.dynamodb", created)
+    emitter.register("before-send.dynamodb", sent)
+
+
+def main(rounds=3):
+    classroom = FakeClassroom()
+    from app import service
+    service.build_http = classroom.http
+
+    with mock_dynamodb():
+        # The stack provisions both tables
+        client = boto3.client("dynamodb")
+        for table_name, key in (("GoogleClassroomStates", "id"),
+                                ("UserMapping", "google_user_id")):
+            client.create_table(
+                TableName=table_name,
+                KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+                ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5})
+
+        # Read back through a session of its own, so as not to be counted
+        states = boto3.Session().resource("dynamodb").Table("GoogleClassroomStates")
+        boto3.setup_default_session()
+        calls = collections.Counter()
+        count_calls(boto3.DEFAULT_SESSION.events, "skill", calls)
+        from app import custom
+        from app.tables import UserMapping
+        count_calls(UserMapping._get_connection().connection.session, "user_mapping", calls)
+
+        per_round = []
+        for _ in range(rounds):
+            before = calls.copy()
+            for e in events():
+                response = custom.get_handler()(e, None)
+                assert response["version"] == "1.0", response
+            per_round.append(calls - before)
+            stored = states.get_item(Key={"id": ALEXA_USER_ID})["Item"]["attributes"]
+            assert stored["registrations"] == {} and stored["googleUserId"] is None, stored
+        names = sorted(set().union(*per_round))
+        print("{:<28} {}".format("", " ".join("round {:<3}".format(i + 1) for i in range(rounds))))
+        for label, name in names:
+            print("{:<28} {}".format(label + " " + name, " ".join(
+                "{:>9}".format(counts[label, name]) for counts in per_round)))
+
+        # The first round pays for the setup: the skill's client and
+        # UserMapping's, and pynamodb's one DescribeTable for the key schema.
+        # (ask-sdk makes a client of its own when imported, for a default
+        # argument, before any event.)
+        assert per_round[0]["skill", "client"] == 1, per_round[0]
+        assert per_round[0]["user_mapping", "client"] == 1, per_round[0]
+        assert per_round[0]["user_mapping", "DescribeTable"] <= 1, per_round[0]
+        for counts in per_round:
+            assert counts["skill", "DescribeTable"] == 0, counts
+            assert counts["skill", "CreateTable"] == counts["user_mapping", "CreateTable"] == 0
+        # After that only the permission events touch DynamoDB: one read and
+        # one write of the skill's attributes each, and a PutItem of
+        # UserMapping for each of them
+        for counts in per_round[1:]:
+            assert counts == collections.Counter({
+                ("skill", "GetItem"): 3, ("skill", "PutItem"): 3,
+                ("user_mapping", "PutItem"): 3}), counts
+        assert custom.get_handler.cache_info().currsize == 1
+        # Every course was registered and unregistered again each round
+        assert classroom.calls["create_registration"] == rounds * len(classroom.courses)
+        assert classroom.calls["delete_registration"] == rounds * len(classroom.courses)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
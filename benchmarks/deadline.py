@@ -0,0 +1,86 @@
+# Invokes the Alexa.Education handlers against a slow fake Classroom API
+# with a Lambda context that has little time left, and reports how long
+# each invocation took, which stages ran out of time and how many items
+# came back. Cold, the answer is whatever arrived in time; with a cache
+# whose course_works and submissions entries have already expired, it is
+# the stale ones.
+#
+#   python benchmarks/deadline.py [remaining_ms] [latency_seconds]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+
+from load_test import synthetic_events  # noqa: E402
+from fake_classroom import FakeClassroom  # noqa: E402
+
+ITEM_KEYS = ("coursework", "courseworkGrades", "schoolCommunications")
+
+
+class Context:
+    # Just the part of the Lambda context the deadline reads
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def items(response):
+    payload = response["response"]["payload"]
+    return next(len(payload[key]) for key in ITEM_KEYS if key in payload)
+
+
+def main():
+    remaining_ms = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.15
+    classroom = FakeClassroom(courses=10, course_works=30, latency=latency)
+
+    from app import announcement_feed, deadline, education, service
+    from app.cache import ResponseCache
+
+    service.build_http = classroom.http
+    # The budget only lives as long as the invocation, so each handler is
+    # wrapped to keep hold of it
+    budgets = []
+
+    def recording(handler):
+        def record_budget(*args):
+            budgets[:] = [deadline.current()]
+            return handler(*args)
+        return record_budget
+
+    for namespace, handler in list(education.HANDLER_MAP.items()):
+        education.HANDLER_MAP[namespace] = recording(handler)
+
+    def use(cache):
+        education.response_cache = announcement_feed.response_cache = cache
+
+    events = synthetic_events()[2:]
+    # Complete answers, and a cache holding them whose course_works and
+    # submissions entries expire right away (user ids and courses stay
+    # fresh)
+    full, stale_cache = {}, ResponseCache(ttls={"course_works": 1, "submissions": 1})
+    for event in events:
+        use(stale_cache)
+        full[id(event)] = items(education.handler(event, None))
+    time.sleep(1.1)
+
+    for name in ("cold", "stale"):
+        for event in events:
+            use(ResponseCache() if name == "cold" else stale_cache)
+            start = time.perf_counter()
+            response = education.handler(event, Context(remaining_ms))
+            elapsed = time.perf_counter() - start
+            print("{:<6} {:<40} {:>6.0f} ms  items {:>3} of {:<3}  exhausted {}".format(
+                name, event["request"]["header"]["namespace"], elapsed * 1000,
+                items(response), full[id(event)], ", ".join(budgets[0].exhausted) or "-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+# In-process stand-in for the Classroom REST API.
+#
+# FakeClassroom generates a deterministic data set and FakeHttp answers
+# httplib2-style `request()` calls against it, including multipart batch
+# requests, with an optional artificial round-trip latency per HTTP call.
+# serve() puts the same thing behind a local HTTP server for clients that
+# do not go through httplib2.
+import collections
+import datetime
+import email.parser
+import http.server
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+import httplib2
+
+STUDENT_ID = "student-1"
+
+_ROUTES = [
+    ("GET", re.compile(r"^/v1/courses$"), "list_courses"),
+    ("GET", re.compile(r"^/v1/courses/([^/]+)$"), "get_course"),
+    ("GET", re.compile(r"^/v1/courses/([^/]+)/courseWork$"), "list_course_work"),
+    ("GET", re.compile(r"^/v1/courses/([^/]+)/courseWork/([^/]+)/studentSubmissions$"),
+     "list_submissions"),
+    ("GET", re.compile(r"^/v1/courses/([^/]+)/announcements$"), "list_announcements"),
+    ("GET", re.compile(r"^/v1/userProfiles/([^/]+)$"), "get_user_profile"),
+    ("POST", re.compile(r"^/v1/registrations$"), "create_registration"),
+    ("DELETE", re.compile(r"^/v1/registrations/([^/]+)$"), "delete_registration"),
+]
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def _timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "{:03d}Z".format(dt.microsecond // 1000)
+
+
+class FakeClassroom:
+    def __init__(self, courses=5, course_works=20, announcements=10, latency=0.0,
+                 error_rate=0.0, batch_limit=None, seed=0, now=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.batch_limit = batch_limit
+        self.calls = collections.Counter()
+        self.http_requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._registrations = {}
+        self._registration_count = 0
+
+        now = now or datetime.datetime.utcnow().replace(microsecond=0)
+        rnd = random.Random(seed)
+        self.courses = []
+        self.course_works = collections.defaultdict(list)
+        self.submissions = collections.defaultdict(list)
+        self.announcements = collections.defaultdict(list)
+        self.profiles = {STUDENT_ID: self._profile(STUDENT_ID, "Sam", "Student")}
+
+        for i in range(courses):
+            course_id = "course-{}".format(i)
+            teacher_id = "teacher-{}".format(i % max(1, courses // 3 or 1))
+            self.profiles.setdefault(teacher_id, self._profile(
+                teacher_id, "Teacher", str(i)))
+            self.courses.append({"id": course_id, "name": "Course {}".format(i),
+                                 "description": "Description {}".format(i)})
+
+            for j in range(course_works):
+                created = now - datetime.timedelta(days=rnd.randint(1, 120))
+                due = now + datetime.timedelta(days=rnd.randint(-60, 14),
+                                               hours=rnd.randint(0, 23))
+                work = {
+                    "id": "{}-work-{}".format(course_id, j),
+                    "courseId": course_id,
+                    "title": "Assignment {}".format(j),
+                    "description": "Do the thing {}".format(j),
+                    "workType": "ASSIGNMENT" if j % 5 else "SHORT_ANSWER_QUESTION",
+                    "maxPoints": 100,
+                    "creationTime": _timestamp(created),
+                    "updateTime": _timestamp(created),
+                    "dueDate": {"year": due.year, "month": due.month, "day": due.day},
+                    "dueTime": {"hours": due.hour, "minutes": 0},
+                }
+                self.course_works[course_id].append(work)
+
+                state = rnd.choice(["NEW", "CREATED", "TURNED_IN", "RETURNED"])
+                submission = {
+                    "id": "{}-submission".format(work["id"]),
+                    "courseId": course_id,
+                    "courseWorkId": work["id"],
+                    "userId": STUDENT_ID,
+                    "state": state,
+                    "creationTime": _timestamp(created),
+                    "updateTime": _timestamp(created + datetime.timedelta(
+                        minutes=rnd.randint(1, 5000))),
+                }
+                if state == "RETURNED":
+                    submission["assignedGrade"] = rnd.randint(40, 100)
+                self.submissions[course_id].append(submission)
+            self.course_works[course_id].sort(
+                key=lambda w: (w["dueDate"]["year"], w["dueDate"]["month"],
+                               w["dueDate"]["day"], w["dueTime"]["hours"]),
+                reverse=True)
+
+            for k in range(announcements):
+                updated = now - datetime.timedelta(minutes=rnd.randint(1, 60 * 24 * 21))
+                self.announcements[course_id].append({
+                    "id": "{}-announcement-{}".format(course_id, k),
+                    "courseId": course_id,
+                    "text": "Announcement {} for {}".format(k, course_id),
+                    "state": "PUBLISHED",
+                    "creatorUserId": teacher_id,
+                    "creationTime": _timestamp(updated),
+                    "updateTime": _timestamp(updated),
+                })
+            self.announcements[course_id].sort(key=lambda a: a["updateTime"], reverse=True)
+
+    def http(self):
+        return FakeHttp(self)
+
+    @staticmethod
+    def _profile(user_id, given, family):
+        return {"id": user_id, "name": {"givenName": given, "familyName": family,
+                                        "fullName": "{} {}".format(given, family)}}
+
+    def dispatch(self, method, uri, body=None):
+        parsed = urlparse(uri)
+        # Repeated parameters such as `states` are joined with commas
+        params = {k: ",".join(v) for k, v in parse_qs(parsed.query).items()}
+        for route_method, pattern, name in _ROUTES:
+            match = pattern.match(unquote(parsed.path))
+            if route_method == method and match:
+                with self._lock:
+                    self.calls[name] += 1
+                    failed = self.error_rate and self._random.random() < self.error_rate
+                if failed:
+                    return 503, {"error": {"code": 503, "message": "Backend Error",
+                                           "status": "UNAVAILABLE"}}
+                return getattr(self, "_" + name)(params, body, *match.groups())
+        return 404, {"error": {"code": 404, "message": "Not found: " + parsed.path}}
+
+    def _page(self, items, key, params):
+        start = int(params.get("pageToken") or 0)
+        size = int(params.get("pageSize") or 0) or DEFAULT_PAGE_SIZE
+        result = {key: items[start:start + size]} if items[start:start + size] else {}
+        if start + size < len(items):
+            result["nextPageToken"] = str(start + size)
+        return 200, result
+
+    def _list_courses(self, params, body):
+        return self._page(self.courses, "courses", params)
+
+    def _get_course(self, params, body, course_id):
+        for course in self.courses:
+            if course["id"] == course_id:
+                return 200, course
+        return 404, {"error": {"code": 404, "message": "Course not found"}}
+
+    def _list_course_work(self, params, body, course_id):
+        return self._page(self.course_works.get(course_id, []), "courseWork", params)
+
+    def _list_submissions(self, params, body, course_id, course_work_id):
+        items = self.submissions.get(course_id, [])
+        if course_work_id != "-":
+            items = [s for s in items if s["courseWorkId"] == course_work_id]
+        if params.get("states"):
+            items = [s for s in items if s["state"] in params["states"].split(",")]
+        return self._page(items, "studentSubmissions", params)
+
+    def _list_announcements(self, params, body, course_id):
+        return self._page(self.announcements.get(course_id, []), "announcements", params)
+
+    def _get_user_profile(self, params, body, user_id):
+        user_id = STUDENT_ID if user_id == "me" else user_id
+        if user_id not in self.profiles:
+            return 404, {"error": {"code": 404, "message": "User not found"}}
+        return 200, self.profiles[user_id]
+
+    def _create_registration(self, params, body):
+        registration = json.loads(body)
+        with self._lock:
+            self._registration_count += 1
+            registration["registrationId"] = "registration-{}".format(self._registration_count)
+            # Classroom expires registrations after a week
+            registration["expiryTime"] = _timestamp(
+                datetime.datetime.utcnow() + datetime.timedelta(days=7))
+            self._registrations[registration["registrationId"]] = registration
+        return 200, registration
+
+    def _delete_registration(self, params, body, registration_id):
+        with self._lock:
+            self._registrations.pop(registration_id, None)
+        return 200, {}
+
+
+class FakeHttp:
+    def __init__(self, classroom):
+        self.classroom = classroom
+
+    def request(self, uri, method="GET", body=None, headers=None,
+                redirections=None, connection_type=None):
+        with self.classroom._lock:
+            self.classroom.http_requests += 1
+        if self.classroom.latency:
+            time.sleep(self.classroom.latency)
+        if urlparse(uri).path == "/batch":
+            return self._batch(body, headers)
+        status, payload = self.classroom.dispatch(method, uri, body)
+        return self._response(status), json.dumps(payload).encode("utf-8")
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _response(status, content_type="application/json; charset=UTF-8"):
+        return httplib2.Response({"status": str(status), "content-type": content_type})
+
+    def _batch(self, body, headers):
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        content_type = {k.lower(): v for k, v in headers.items()}["content-type"]
+        message = email.parser.Parser().parsestr(
+            "content-type: {}\r\n\r\n{}".format(content_type, body))
+
+        boundary = "batch_fake_boundary"
+        parts = []
+        for index, part in enumerate(message.get_payload()):
+            request_line, _, rest = part.get_payload().replace("\r\n", "\n").partition("\n")
+            method, path, _ = request_line.strip().split(" ", 2)
+            sub_body = rest.split("\n\n", 1)[1] if "\n\n" in rest else None
+            if self.classroom.batch_limit and index >= self.classroom.batch_limit:
+                # Like Classroom, a batch over the limit is rate limited
+                status, payload = 429, {"error": {"code": 429, "message": "Rate Limit Exceeded",
+                                                  "errors": [{"reason": "rateLimitExceeded"}]}}
+            else:
+                status, payload = self.classroom.dispatch(
+                    method, "https://classroom.googleapis.com" + path, sub_body or None)
+            content_id = part["Content-ID"]
+            parts.append(
+                "--{}\r\nContent-Type: application/http\r\n"
+                "Content-ID: <response-{}\r\n\r\n"
+                "HTTP/1.1 {} {}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                "{}\r\n".format(boundary, content_id[1:], status,
+                                "OK" if status < 300 else "ERROR", json.dumps(payload)))
+        content = "".join(parts) + "--{}--\r\n".format(boundary)
+        response = self._response(200, 'multipart/mixed; boundary={}'.format(boundary))
+        return response, content.encode("utf-8")
+
+
+def serve(classroom, port=0, ssl_context=None):
+    # Answers real HTTP on 127.0.0.1 through FakeHttp, one thread per
+    # connection so latency overlaps the way it would against the API, and
+    # HTTPS given an ssl_context. Returns the server, already serving on a
+    # daemon thread; server.connections counts the connections accepted.
+    fake_http = FakeHttp(classroom)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            response, content = fake_http.request(self.path, self.command, body,
+                                                  dict(self.headers.items()))
+            self.send_response(int(response["status"]))
+            self.send_header("Content-Type", response["content-type"])
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        # The default backlog of 5 makes concurrent clients wait out a SYN
+        # retransmit
+        request_queue_size = 128
+        daemon_threads = True
+        connections = 0
+
+        def get_request(self):
+            request = super().get_request()
+            self.connections += 1
+            return request
+
+    server = Server(("127.0.0.1", port), Handler)
+    if ssl_context is not None:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
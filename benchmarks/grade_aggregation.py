@@ -0,0 +1,109 @@
+# Compares the old per-coursework filter loop of coursework_grade_handler
+# with the grades module on synthetic data: 50 courses x 500 assignments,
+# one submission per assignment and most of them graded. Both paths are
+# checked to report the same grades before timing.
+#
+#   python benchmarks/grade_aggregation.py [courses] [assignments] [max_results]
+import collections
+import datetime
+import itertools
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+from app import grades  # noqa: E402
+
+STUDENT_ID = "student-1"
+
+
+def synthetic(courses, assignments, seed=0):
+    rnd = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    all_courses, all_course_works = {}, {}
+    all_submissions = collections.defaultdict(list)
+    for i in range(courses):
+        course_id = "course-{}".format(i)
+        all_courses[course_id] = "Course {}".format(i)
+        for j in range(assignments):
+            course_work_id = "{}-work-{}".format(course_id, j)
+            all_course_works[course_work_id] = {
+                "id": course_work_id, "courseId": course_id,
+                "title": "Assignment {}".format(j), "maxPoints": 100}
+            submission = {
+                "courseId": course_id, "courseWorkId": course_work_id,
+                "updateTime": (start + datetime.timedelta(
+                    seconds=rnd.randint(0, 10 ** 7))).isoformat() + ".{}Z".format(rnd.randint(1, 999))}
+            if rnd.random() < 0.8:
+                submission["assignedGrade"] = rnd.randint(40, 100)
+            all_submissions[course_work_id].append(submission)
+    return all_courses, all_course_works, all_submissions
+
+
+def grade_response(course_work_id, course_id, course_name, title, score, max_points,
+                   graded_time):
+    return {
+        "courseworkId": course_work_id,
+        "courseId": course_id,
+        "courseName": course_name,
+        "studentId": STUDENT_ID,
+        "courseworkType": "ASSIGNMENT",
+        "courseworkTitle": title,
+        "grade": {"overallGrade": {"gradeScore": {
+            "type": "POINTS", "score": score, "maxPoints": max_points}}},
+        "lastGradedTime": graded_time,
+    }
+
+
+def before(all_courses, all_course_works, all_submissions, max_results):
+    # The old handler converted every grade, in whatever order they came in
+    all_grades = []
+    for student_submissions in all_submissions.values():
+        graded_submissions = list(filter(lambda s: s.get(
+            "assignedGrade") is not None, student_submissions))
+        if len(graded_submissions) > 0:
+            last_submission = graded_submissions[-1]
+            course_work_id = last_submission['courseWorkId']
+            course_id = last_submission['courseId']
+            course_work = all_course_works.get(course_work_id)
+            course_name = all_courses.get(course_id)
+            if course_work is None or course_name is None or course_work.get("title") is None\
+                    or course_work.get("maxPoints") is None or course_work.get("maxPoints") == 0:
+                continue
+            all_grades.append(grade_response(
+                course_work_id, course_id, course_name, course_work["title"],
+                last_submission["assignedGrade"], course_work["maxPoints"],
+                last_submission["updateTime"]))
+    return all_grades
+
+
+def after(all_courses, all_course_works, all_submissions, max_results):
+    latest = grades.latest_grades(itertools.chain.from_iterable(all_submissions.values()))
+    return [grade_response(grade.course_work_id, grade.course_id, grade.course_name, grade.title,
+                           grade.score, grade.max_points, grade.graded_time)
+            for grade in grades.top_grades(latest, all_course_works, all_courses, max_results)]
+
+
+def main():
+    courses = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    assignments = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    max_results = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    data = synthetic(courses, assignments)
+
+    expected = before(*data, max_results=None)
+    actual = after(*data, max_results=len(expected))
+    assert sorted(map(repr, expected)) == sorted(map(repr, actual)),\
+        "grade aggregation changed its results"
+
+    print("{} courses x {} assignments, {} graded, maxResults {}".format(
+        courses, assignments, len(expected), max_results))
+    for name, fn in (("before", before), ("after", after)):
+        elapsed = min(timeit.repeat(lambda: fn(*data, max_results=max_results),
+                                    number=5, repeat=3)) / 5
+        print("{:<7} {:>9.1f} ms".format(name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Measures the import cost of each route through education.handler.
+#
+# Every route runs in a fresh interpreter under `python -X importtime`.
+# The interpreter imports app.education and dispatches one synthetic
+# event. Google calls fail fast against a stub transport, so only imports
+# are measured. The report lists the total import time and the heaviest
+# packages of each route.
+#
+#   python benchmarks/import_time.py [--json]
+import json
+import os
+import re
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+MARKER = "--- route start"
+
+NAMESPACE_PAYLOADS = {
+    "Alexa.Education.Profile.Student": {},
+    "Alexa.Education.Course": {
+        "query": {"matchAll": {"studentId": "me"}},
+        "paginationContext": {"maxResults": 10}},
+    "Alexa.Education.Coursework": {
+        "query": {"matchAll": {"studentId": "me", "dueTime": {
+            "start": "2020-04-20T00:00:00Z", "end": "2020-04-21T00:00:00Z"}}},
+        "paginationContext": {"maxResults": 10}},
+    "Alexa.Education.Grade.Coursework": {
+        "query": {"matchAll": {"studentId": "me"}},
+        "paginationContext": {"maxResults": 10}},
+    "Alexa.Education.School.Communication": {
+        "query": {"matchAll": {}},
+        "paginationContext": {"maxResults": 10}},
+}
+
+CUSTOM_EVENT = {
+    "version": "1.0",
+    "context": {"System": {
+        "application": {"applicationId": "amzn1.ask.skill.benchmark"},
+        "user": {"userId": "amzn1.ask.account.benchmark"},
+        "apiEndpoint": "https://api.amazonalexa.com"}},
+    "request": {"type": "AlexaSkillEvent.SkillAccountLinked",
+                "requestId": "benchmark", "timestamp": "2020-04-20T00:00:00Z"},
+}
+
+SNIPPET = """
+import json, sys
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+import app.education
+import app.service
+
+class StubHttp:
+    def request(self, *args, **kwargs):
+        raise RuntimeError("offline")
+
+app.service.build_http = StubHttp
+try:
+    app.education.handler(json.loads({event!r}), None)
+except Exception:
+    pass
+"""
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def education_event(namespace, payload):
+    return {"request": {
+        "header": {"namespace": namespace, "name": "Get"},
+        "authorization": {"token": "token"},
+        "payload": payload}}
+
+
+def measure(event):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         SNIPPET.format(marker=MARKER, event=json.dumps(event))],
+        cwd=LAMBDA_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    lines = result.stderr.split(MARKER, 1)[1].splitlines()
+
+    total_us, packages = 0, {}
+    for line in lines:
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)), match.group(4)
+        if len(match.group(3)) == 1:
+            total_us += cumulative
+        if "." not in name and name != "app":
+            packages[name] = max(packages.get(name, 0), cumulative)
+    return {"total_ms": total_us / 1000.0,
+            "heaviest": [(name, cumulative / 1000.0) for name, cumulative
+                         in sorted(packages.items(), key=lambda p: -p[1])[:5]]}
+
+
+def main():
+    routes = [(namespace, education_event(namespace, payload))
+              for namespace, payload in NAMESPACE_PAYLOADS.items()]
+    routes.append(("custom:" + CUSTOM_EVENT["request"]["type"], CUSTOM_EVENT))
+
+    report = {name: measure(event) for name, event in routes}
+    if "--json" in sys.argv:
+        print(json.dumps(report, indent=2))
+        return
+    for name, result in report.items():
+        heaviest = ", ".join("{} {:.0f}ms".format(n, ms) for n, ms in result["heaviest"][:3])
+        print("{:<45} {:>8.1f} ms   {}".format(name, result["total_ms"], heaviest))
+
+
+if __name__ == "__main__":
+    main()
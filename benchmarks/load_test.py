@@ -0,0 +1,256 @@
+# Replays Alexa.Education events through education.handler against the
+# fake Classroom API and reports, per namespace, p50/p95/p99 latency, the
+# HTTP round trips and API calls (batch parts included) per invocation,
+# peak traced memory and failed invocations.
+#
+# Events are the recorded ones in benchmarks/events/education.json, with
+# their due windows moved to the replay time, or synthetic ones built here
+# (--synthetic). The student only ever sees their own submissions, so
+# their number follows --course-works: one per coursework.
+#
+# --save writes the results as a baseline and --baseline compares against
+# one. A namespace regresses when it makes more calls than the baseline,
+# or when its p95/p99 latency or its peak memory grows by more than
+# --tolerance. The exit status is 1 if anything regressed. Call counts
+# carry over between machines; latency and memory only compare against a
+# baseline recorded on the same one.
+#
+#   python benchmarks/load_test.py [--iterations 30] [--latency 0.01]
+#       [--courses 10] [--course-works 30] [--announcements 15]
+#       [--error-rate 0] [--engine sync|async] [--warm] [--synthetic]
+#       [--baseline benchmarks/baseline.json] [--save PATH]
+import argparse
+import collections
+import datetime
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+
+from fake_classroom import STUDENT_ID, FakeClassroom, serve  # noqa: E402
+
+EVENTS_PATH = os.path.join(os.path.dirname(__file__), "events", "education.json")
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "http", "calls", "peak_kib", "errors")
+
+
+def education_event(namespace, payload):
+    return {"request": {
+        "header": {"namespace": namespace, "name": "Get"},
+        "authorization": {"token": "token"},
+        "payload": payload}}
+
+
+def synthetic_events():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    query = {"query": {"matchAll": {"studentId": STUDENT_ID}},
+             "paginationContext": {"maxResults": 10}}
+    return [
+        education_event("Alexa.Education.Profile.Student", {"query": {"matchAll": {}}}),
+        education_event("Alexa.Education.Course", query),
+        education_event("Alexa.Education.Coursework", {
+            "query": {"matchAll": {"studentId": STUDENT_ID, "dueTime": {
+                "start": (now - datetime.timedelta(days=1)).isoformat(),
+                "end": (now + datetime.timedelta(days=7)).isoformat()}}},
+            "paginationContext": {"maxResults": 10}}),
+        education_event("Alexa.Education.Grade.Coursework", query),
+        education_event("Alexa.Education.School.Communication", query),
+    ]
+
+
+def recorded_events(path):
+    # Fake data is generated around the current time, so a recorded due
+    # window is moved forward by the time since it was recorded
+    from app import timeutil
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with open(path) as f:
+        recorded = json.load(f)
+    events = []
+    for entry in recorded:
+        event = entry["event"]
+        due_time = event["request"]["payload"].get("query", {}).get("matchAll", {}).get("dueTime")
+        if due_time:
+            shift = now - timeutil.parse(entry["recordedAt"])
+            for bound in ("start", "end"):
+                due_time[bound] = (timeutil.parse(due_time[bound]) + shift).isoformat()
+        events.append(event)
+    return events
+
+
+def percentile(values, p):
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def run(args, classroom, events):
+    from app import announcement_feed, education
+    from app.cache import ResponseCache
+
+    modules = [education, announcement_feed]
+    if args.engine == "async":
+        from app import aio
+        modules.append(aio)
+
+    def invoke(event):
+        if not args.warm:
+            cache = ResponseCache()
+            for module in modules:
+                module.response_cache = cache
+        try:
+            education.handler(event, None)
+        except Exception:
+            return False
+        return True
+
+    # One untimed pass, so imports and the first service build are not
+    # charged to whichever namespace comes first
+    for event in events:
+        invoke(event)
+
+    samples = collections.defaultdict(lambda: collections.defaultdict(list))
+    for _ in range(args.iterations):
+        for event in events:
+            namespace = event["request"]["header"]["namespace"]
+            http, calls = classroom.http_requests, sum(classroom.calls.values())
+            start = time.perf_counter()
+            ok = invoke(event)
+            samples[namespace]["latency"].append(time.perf_counter() - start)
+            samples[namespace]["http"].append(classroom.http_requests - http)
+            samples[namespace]["calls"].append(sum(classroom.calls.values()) - calls)
+            samples[namespace]["errors"].append(0 if ok else 1)
+
+    # Memory is traced in a pass of its own, as tracemalloc slows every
+    # allocation down
+    for event in events:
+        tracemalloc.start()
+        invoke(event)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        samples[event["request"]["header"]["namespace"]]["peak"].append(peak)
+
+    results = {}
+    for namespace, sample in samples.items():
+        latency = sample["latency"]
+        results[namespace] = {
+            "p50_ms": round(percentile(latency, 50) * 1000, 2),
+            "p95_ms": round(percentile(latency, 95) * 1000, 2),
+            "p99_ms": round(percentile(latency, 99) * 1000, 2),
+            "http": round(sum(sample["http"]) / len(sample["http"]), 2),
+            "calls": round(sum(sample["calls"]) / len(sample["calls"]), 2),
+            "peak_kib": round(max(sample["peak"]) / 1024, 1),
+            "errors": sum(sample["errors"]),
+        }
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for namespace, metrics in results.items():
+        before = baseline.get(namespace)
+        if before is None:
+            continue
+        for metric in ("http", "calls", "errors"):
+            if metrics[metric] > before[metric]:
+                found.append((namespace, metric))
+        for metric in ("p95_ms", "p99_ms", "peak_kib"):
+            if metrics[metric] > before[metric] * (1 + tolerance):
+                found.append((namespace, metric))
+    return found
+
+
+def report(results, baseline, found):
+    print("{:<40}".format("namespace") + "".join("{:>12}".format(m) for m in METRICS))
+    for namespace, metrics in results.items():
+        print("{:<40}".format(namespace) + "".join(
+            "{:>12}".format(metrics[m]) for m in METRICS))
+        before = baseline.get(namespace)
+        if before:
+            marks = ["!" if (namespace, m) in found else " " for m in METRICS]
+            print("{:<40}".format("  vs baseline") + "".join(
+                "{:>12}".format(_change(metrics[m], before[m]) + mark)
+                for m, mark in zip(METRICS, marks)))
+
+
+def _change(after, before):
+    if before == after:
+        return "="
+    if not before:
+        return "+{}".format(after)
+    return "{:+.0%}".format((after - before) / before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test education.handler")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="seconds per HTTP round trip")
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--course-works", type=int, default=30)
+    parser.add_argument("--announcements", type=int, default=15)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of API calls answered with a 503")
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync")
+    parser.add_argument("--warm", action="store_true",
+                        help="keep the response cache between invocations")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="use synthetic events instead of the recorded ones")
+    parser.add_argument("--events", default=EVENTS_PATH)
+    parser.add_argument("--baseline")
+    parser.add_argument("--save")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in (
+        "iterations", "latency", "courses", "course_works", "announcements", "error_rate",
+        "engine", "warm", "synthetic")}
+    classroom = FakeClassroom(courses=args.courses, course_works=args.course_works,
+                              announcements=args.announcements, latency=args.latency,
+                              error_rate=args.error_rate)
+    # The asyncio engine needs a real HTTP endpoint; the synchronous one
+    # talks to the fake in-process
+    os.environ["EDUCATION_ENGINE"] = args.engine
+    if args.engine == "async":
+        server = serve(classroom)
+        os.environ["CLASSROOM_API_ROOT"] = "http://127.0.0.1:{}/".format(
+            server.server_address[1])
+    else:
+        from app import service
+        service.build_http = classroom.http
+
+    events = synthetic_events() if args.synthetic else recorded_events(args.events)
+    results = run(args, classroom, events)
+    if args.engine == "async":
+        from app import aio
+        if aio._session is not None:
+            aio._loop.run_until_complete(aio._session.close())
+
+    baseline, found = {}, []
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved["config"] != config:
+            print("Baseline was recorded with {}".format(saved["config"]))
+        baseline = saved["results"]
+        found = regressions(results, baseline, args.tolerance)
+    report(results, baseline, found)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if found:
+        print("Regressed: " + ", ".join("{} {}".format(*item) for item in found))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Delivers Classroom notifications to the Pub/Sub push handler the way a
+# push subscription would, and checks that only authenticated pushes reach
+# the coursework index, which runs on moto's DynamoDB. Google's signing
+# certificates are served from a local HTTP server with a key made up
+# here, so the OIDC tokens are signed with it. Needs moto and the pinned
+# pynamodb/botocore from requirements.txt.
+#
+#   python benchmarks/push_consumer.py
+import base64
+import datetime
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.pop("DYNAMODB_HOST", None)
+os.environ["COURSEWORK_INDEX_TABLE"] = "CourseworkIndex"
+os.environ["PUBSUB_PUSH_AUDIENCE"] = "https://example.com/notifications"
+os.environ["PUBSUB_PUSH_SERVICE_ACCOUNT"] = "push@project.iam.gserviceaccount.com"
+os.environ["PUBSUB_PUSH_TOKEN"] = "push-secret"
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.backends import default_backend  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from google.auth import crypt, jwt  # noqa: E402
+
+try:
+    from moto import mock_aws as mock_dynamodb
+except ImportError:
+    from moto import mock_dynamodb2 as mock_dynamodb
+
+COURSE_ID = "course-1"
+STUDENT_KEYS = ("alexa-1#student-1", "alexa-2#student-2")
+
+
+def signing_key(key_id):
+    # A private key and the JSON Google would publish for it
+    key = rsa.generate_private_key(65537, 2048, default_backend())
+    name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, key_id)])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name) \
+        .public_key(key.public_key()).serial_number(1) \
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .sign(key, hashes.SHA256(), default_backend())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    return crypt.RSASigner.from_string(pem, key_id), \
+        cert.public_bytes(serialization.Encoding.PEM).decode("ascii")
+
+
+def serve_certs(certs):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            Handler.fetches += 1
+            body = json.dumps(certs).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    Handler.fetches = 0
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler
+
+
+def oidc_token(signer, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": os.environ["PUBSUB_PUSH_AUDIENCE"],
+        "email": os.environ["PUBSUB_PUSH_SERVICE_ACCOUNT"],
+        "email_verified": True,
+        "sub": "1234567890",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(signer, claims).decode("ascii")
+
+
+def push_event(notification, token=None, secret=None):
+    # What API Gateway hands the Lambda for one Pub/Sub push
+    envelope = {
+        "message": {
+            "data": base64.b64encode(json.dumps(notification).encode("utf-8")).decode("ascii"),
+            "attributes": {"registrationId": "registration-1"},
+            "messageId": "1",
+        },
+        "subscription": "projects/project/subscriptions/classroom-push",
+    }
+    return {
+        "body": json.dumps(envelope),
+        "headers": {"Authorization": "Bearer " + token} if token else {},
+        "queryStringParameters": {"token": secret} if secret is not None else None,
+    }
+
+
+def course_work_deleted(course_work_id):
+    return {"collection": "courses.courseWork", "eventType": "DELETED",
+            "resourceId": {"courseId": COURSE_ID, "id": course_work_id}}
+
+
+def course_work_modified(course_work_id):
+    return {"collection": "courses.courseWork", "eventType": "MODIFIED",
+            "resourceId": {"courseId": COURSE_ID, "id": course_work_id}}
+
+
+def seed(CourseworkIndexEntry):
+    CourseworkIndexEntry.create_table(read_capacity_units=5, write_capacity_units=5, wait=True)
+    for key in STUDENT_KEYS:
+        CourseworkIndexEntry(
+            key, COURSE_ID,
+            course_works=json.dumps([{"id": "cw-{}".format(i), "courseId": COURSE_ID}
+                                     for i in range(3)]),
+            submissions=json.dumps([{"courseWorkId": "cw-{}".format(i), "state": "CREATED"}
+                                    for i in range(3)]),
+            refreshed_at=int(time.time()),
+            stale=False).save()
+
+
+def index_state(CourseworkIndexEntry):
+    return {key: (sorted(cw["id"] for cw in json.loads(entry.course_works)), entry.stale)
+            for key in STUDENT_KEYS
+            for entry in [CourseworkIndexEntry.get(key, COURSE_ID)]}
+
+
+def main():
+    signer, cert = signing_key("key-1")
+    stranger, _ = signing_key("key-2")
+    server, certs = serve_certs({"key-1": cert})
+    os.environ["GOOGLE_CERTS_URL"] = "http://127.0.0.1:{}/oauth2/v1/certs".format(
+        server.server_address[1])
+
+    with mock_dynamodb():
+        from app import notification_consumer
+        from app.tables import CourseworkIndexEntry
+        seed(CourseworkIndexEntry)
+        before = index_state(CourseworkIndexEntry)
+
+        # Pushes that do not come from the subscription are refused and
+        # leave the index alone
+        refused = [
+            ("no credentials", push_event(course_work_deleted("cw-0")), 401),
+            ("wrong secret", push_event(course_work_deleted("cw-0"), secret="guess"), 403),
+            ("empty secret", push_event(course_work_deleted("cw-0"), secret=""), 403),
+            ("not a JWT", push_event(course_work_deleted("cw-0"), token="abc.def.ghi"), 403),
+            ("unknown key", push_event(course_work_deleted("cw-0"),
+                                       token=oidc_token(stranger)), 403),
+            ("other audience", push_event(course_work_deleted("cw-0"),
+                                          token=oidc_token(signer, aud="https://other")), 403),
+            ("other account", push_event(course_work_deleted("cw-0"), token=oidc_token(
+                signer, email="attacker@project.iam.gserviceaccount.com")), 403),
+            ("unverified email", push_event(course_work_deleted("cw-0"),
+                                            token=oidc_token(signer, email_verified=False)), 403),
+            ("other issuer", push_event(course_work_deleted("cw-0"),
+                                        token=oidc_token(signer, iss="https://evil.example")), 403),
+            ("expired", push_event(course_work_deleted("cw-0"), token=oidc_token(
+                signer, iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)), 403),
+        ]
+        for name, event, status in refused:
+            response = notification_consumer.handler(event, None)
+            assert response["statusCode"] == status, (name, response)
+            print("{:<20} {}".format(name, response["statusCode"]))
+        assert index_state(CourseworkIndexEntry) == before
+
+        # A signed push removes the deleted coursework from every student
+        response = notification_consumer.handler(
+            push_event(course_work_deleted("cw-0"), token=oidc_token(signer)), None)
+        assert response["statusCode"] == 204, response
+        print("{:<20} {}".format("OIDC token", response["statusCode"]))
+        assert index_state(CourseworkIndexEntry) == {
+            key: (["cw-1", "cw-2"], False) for key in STUDENT_KEYS}
+
+        # So does one with the shared secret, and any other change marks the
+        # course stale
+        response = notification_consumer.handler(
+            push_event(course_work_modified("cw-1"), secret="push-secret"), None)
+        assert response["statusCode"] == 204, response
+        print("{:<20} {}".format("shared secret", response["statusCode"]))
+        assert index_state(CourseworkIndexEntry) == {
+            key: (["cw-1", "cw-2"], True) for key in STUDENT_KEYS}
+
+        # Messages pulled from the subscription skip the push check
+        notification_consumer.process_message(
+            json.dumps(course_work_deleted("cw-2")).encode("utf-8"), {})
+        assert index_state(CourseworkIndexEntry) == {
+            key: (["cw-1"], True) for key in STUDENT_KEYS}
+        print("{:<20} applied".format("pulled message"))
+
+    # The certificates were fetched once, not once per push
+    assert certs.fetches == 1, certs.fetches
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
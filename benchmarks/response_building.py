@@ -0,0 +1,80 @@
+# Builds Alexa.Education coursework and grade responses of 5,000 items
+# each from the fake Classroom data set and reports, per response, the
+# time to build it, to encode it with the standard library as the Lambda
+# runtime does, to check it against the schemas as debug runs do, and to
+# round-trip the coursework behind it through app.codec, the encoding the
+# response cache, single-flight table and coursework index store.
+#
+#   python benchmarks/response_building.py [items] [repeats]
+import collections
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("TRACING_ENABLED", "false")
+
+from fake_classroom import STUDENT_ID, FakeClassroom  # noqa: E402
+
+COURSES = 50
+
+
+def best(repeats, fn):
+    # Best of `repeats`, in milliseconds, and the last result
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    classroom = FakeClassroom(courses=COURSES, course_works=-(-items // COURSES))
+
+    from app import codec, education, responses
+
+    all_courses = {course["id"]: course["name"] for course in classroom.courses}
+    course_works = [course_work for course_works in classroom.course_works.values()
+                    for course_work in course_works][:items]
+    all_submissions = collections.defaultdict(list)
+    for submissions in classroom.submissions.values():
+        for submission in submissions:
+            # Every coursework graded, so the grade response has them all
+            all_submissions[submission["courseWorkId"]].append(
+                dict(submission, assignedGrade=submission.get("assignedGrade", 90)))
+
+    builds = [
+        ("coursework", education.COURSEWORK_NAMESPACE, lambda: education.coursework_response(
+            course_works, all_submissions, all_courses)),
+        ("grades", education.COURSE_WORK_GRADE_NAMESPACE, lambda: education.grade_response(
+            {course_work["id"]: course_work for course_work in course_works}, all_submissions,
+            all_courses, STUDENT_ID, items)),
+    ]
+    print("codec backend: {}".format("orjson" if codec.orjson is not None else "json"))
+    for name, namespace, build in builds:
+        build_ms, response = best(repeats, build)
+        encode_ms, _ = best(repeats, lambda: json.dumps(response))
+        validate_ms, problems = best(repeats, lambda: responses.validate(namespace, response))
+        assert not problems, problems[:5]
+        print("{:<11} {:>5} items  build {:>6.1f} ms  runtime encode {:>6.1f} ms  "
+              "debug validation {:>6.1f} ms".format(
+                  name, response["response"]["payload"]["paginationContext"]["totalCount"],
+                  build_ms, encode_ms, validate_ms))
+
+    stored = (course_works, all_submissions)
+    for label, dumps, loads in (("json", json.dumps, json.loads),
+                                ("codec", codec.dumps, codec.loads)):
+        dumps_ms, text = best(repeats, lambda: dumps(stored))
+        loads_ms, _ = best(repeats, lambda: loads(text))
+        print("{:<6} stored coursework  dumps {:>6.1f} ms  loads {:>6.1f} ms  {:>8} bytes".format(
+            label, dumps_ms, loads_ms, len(text)))
+
+
+if __name__ == "__main__":
+    main()
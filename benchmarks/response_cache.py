@@ -0,0 +1,141 @@
+# Exercises the DynamoDB tier of the response cache on moto's DynamoDB:
+# what one container stores another loads, expired items are misses but
+# still serve as stale copies, incomplete fetches are not stored and a
+# table that cannot be read is a miss rather than an error. Each step
+# checks the hit and miss counts, both in ResponseCache.stats and in the
+# trace counters that reach CloudWatch. Needs moto and the pinned
+# pynamodb/botocore from requirements.txt.
+#
+#   python benchmarks/response_cache.py
+import collections
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ["TRACING_ENABLED"] = "true"
+os.environ.pop("DYNAMODB_HOST", None)
+os.environ["RESPONSE_CACHE_TABLE"] = "ClassroomResponseCache"
+
+from pynamodb.attributes import NumberAttribute, UnicodeAttribute  # noqa: E402
+from pynamodb.models import Model  # noqa: E402
+
+try:
+    from moto import mock_aws as mock_dynamodb
+except ImportError:
+    from moto import mock_dynamodb2 as mock_dynamodb
+
+USER_ID = "user-1"
+COURSES = [{"id": "course-1", "name": "Biology"}, {"id": "course-2", "name": "Algebra"}]
+
+
+def traced(name, fn):
+    # Runs fn() as its own invocation and returns its result with the
+    # counters of the metrics line the invocation printed
+    from app import tracing
+    output = io.StringIO()
+    tracing.begin(name)
+    try:
+        result = fn()
+    finally:
+        with contextlib.redirect_stdout(output):
+            tracing.finish()
+    record = json.loads(output.getvalue())
+    metrics = {metric["Name"] for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    return result, collections.Counter({
+        name[len("count."):]: value for name, value in record.items()
+        if name.startswith("count.") and name in metrics})
+
+
+def check(step, counts, cache, before, expected):
+    # The trace counters and the change in stats both match `expected`
+    expected = collections.Counter(expected)
+    assert counts == collections.Counter(
+        {"cache." + name: value for name, value in expected.items()}), (step, counts)
+    assert cache.stats - before == expected, (step, cache.stats - before)
+    print("{:<28} {}".format(step, ", ".join(
+        "{} {}".format(name, value) for name, value in sorted(expected.items()))))
+
+
+def main():
+    with mock_dynamodb():
+        from app import completeness
+        from app.cache import MISSING, ResponseCache
+        from app.tables import CachedResponse
+        CachedResponse.create_table(read_capacity_units=5, write_capacity_units=5, wait=True)
+
+        # Two containers of the skill share the table
+        first, second = ResponseCache(model=CachedResponse), ResponseCache(model=CachedResponse)
+
+        before = first.stats.copy()
+        value, counts = traced("first", lambda: first.get(
+            USER_ID, "courses", "me", lambda: COURSES))
+        assert value == COURSES
+        item = CachedResponse.get(ResponseCache.key(USER_ID, "courses", "me"))
+        assert abs(item.expires_at - (time.time() + first.ttls["courses"])) < 5, item.expires_at
+        check("first container, cold", counts, first, before,
+              {"courses.memory.miss": 1, "courses.dynamodb.miss": 1})
+
+        before = second.stats.copy()
+        value, counts = traced("second", lambda: [
+            second.get(USER_ID, "courses", "me", lambda: None) for _ in range(2)])
+        assert value == [COURSES, COURSES], value
+        check("second container", counts, second, before,
+              {"courses.memory.miss": 1, "courses.dynamodb.hit": 1, "courses.memory.hit": 1})
+
+        # None is a value like any other once stored
+        first.put(USER_ID, "profiles", "nobody", None)
+        assert second._load(ResponseCache.key(USER_ID, "profiles", "nobody")) is None
+
+        # DynamoDB sweeps expired items late, so they are still read
+        stale_key = ResponseCache.key(USER_ID, "course_works", ["course-1"])
+        second._store(stale_key, {"cw-1": {"id": "cw-1"}}, -60)
+        assert second._load(stale_key) is MISSING
+        assert second._load(stale_key, expired_ok=True) == {"cw-1": {"id": "cw-1"}}
+        before = first.stats.copy()
+        value, counts = traced("expired", lambda: (
+            first.lookup(USER_ID, "course_works", ["course-1"]),
+            first.stale(USER_ID, "course_works", ["course-1"])))
+        assert value == (MISSING, {"cw-1": {"id": "cw-1"}}), value
+        check("expired item", counts, first, before, {
+            "course_works.memory.miss": 1, "course_works.dynamodb.miss": 1,
+            "course_works.stale": 1})
+
+        # A fetch that comes back incomplete is answered but not stored
+        def incomplete():
+            completeness.mark("courseWork")
+            return {}
+        value, counts = traced("incomplete", lambda: first.get(
+            USER_ID, "course_works", ["course-2"], incomplete))
+        assert value == {}
+        assert counts == collections.Counter({
+            "cache.course_works.memory.miss": 1, "cache.course_works.dynamodb.miss": 1}), counts
+        assert second._load(ResponseCache.key(USER_ID, "course_works", ["course-2"])) is MISSING
+
+        # A table that cannot be read or written is only a miss
+        class Unavailable(Model):
+            class Meta:
+                table_name = "NoSuchTable"
+                region = "us-east-1"
+            cache_key = UnicodeAttribute(hash_key=True)
+            payload = UnicodeAttribute()
+            expires_at = NumberAttribute()
+        broken = ResponseCache(model=Unavailable)
+        before = broken.stats.copy()
+        value, counts = traced("unavailable", lambda: (
+            broken.get(USER_ID, "courses", "me", lambda: COURSES),
+            broken.stale(USER_ID, "profiles", "nobody")))
+        assert value == (COURSES, None), value
+        check("unavailable table", counts, broken, before,
+              {"courses.memory.miss": 1, "courses.dynamodb.miss": 1})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Compares the per-request cost of building the Classroom client.
+#
+# "before" is the old `build('classroom', 'v1', ...)` path with the discovery
+# fetch served from memory by HttpMock, so it is a lower bound: in Lambda the
+# document also has to come over the network on every request.
+#
+#   python benchmarks/service_setup.py [iterations]
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+from googleapiclient.discovery import build  # noqa: E402
+from googleapiclient.http import HttpMock  # noqa: E402
+
+from app.service import DISCOVERY_DOCUMENT_PATH, get_service  # noqa: E402
+
+
+def before():
+    http = HttpMock(DISCOVERY_DOCUMENT_PATH, {"status": "200"})
+    return build("classroom", "v1", http=http, cache_discovery=False)
+
+
+def after():
+    return get_service(Credentials("token"))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    after()  # the one-off parse happens at container start
+    for name, fn in (("before", before), ("after", after)):
+        elapsed = timeit.timeit(fn, number=iterations)
+        print("{:<7} {:>9.3f} ms/request".format(name, elapsed * 1000 / iterations))
+
+
+if __name__ == "__main__":
+    main()
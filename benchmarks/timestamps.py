@@ -0,0 +1,70 @@
+# Compares the old dateutil path with app.timeutil on synthetic
+# announcement timestamps (100k by default): the 7-day cutoff check the
+# announcements handler runs per item, and plain parsing. Both paths are
+# checked to agree before timing.
+#
+#   python benchmarks/timestamps.py [announcements]
+import datetime
+import os
+import random
+import sys
+import timeit
+
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+
+from app import timeutil  # noqa: E402
+
+
+def synthetic(count, seed=0):
+    rnd = random.Random(seed)
+    now = datetime.datetime.now(timeutil.UTC)
+    timestamps = []
+    for _ in range(count):
+        updated = now - datetime.timedelta(seconds=rnd.randint(0, 21 * 24 * 3600),
+                                           microseconds=rnd.randint(0, 999) * 1000)
+        # The API drops the fraction when it is zero
+        text = updated.strftime("%Y-%m-%dT%H:%M:%S")
+        if rnd.random() < 0.9:
+            text += ".{:03d}".format(updated.microsecond // 1000)
+        timestamps.append({"updateTime": text + "Z"})
+    return timestamps
+
+
+def cutoff_before(announcements):
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    start = start.replace(tzinfo=datetime.timezone.utc)
+    return [dateutil.parser.isoparse(a['updateTime']) < start for a in announcements]
+
+
+def cutoff_after(announcements):
+    start_key = timeutil.days_ago_key(7)
+    return [timeutil.timestamp_key(a['updateTime']) < start_key for a in announcements]
+
+
+def parse_before(announcements):
+    return [dateutil.parser.isoparse(a['updateTime']) for a in announcements]
+
+
+def parse_after(announcements):
+    return [timeutil.parse(a['updateTime']) for a in announcements]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    announcements = synthetic(count)
+    assert parse_before(announcements) == parse_after(announcements), "parsing differs"
+    assert cutoff_before(announcements) == cutoff_after(announcements), "cutoff differs"
+
+    print("{} announcements".format(count))
+    for name, before, after in (("7-day cutoff", cutoff_before, cutoff_after),
+                                ("parse", parse_before, parse_after)):
+        timings = [min(timeit.repeat(lambda: fn(announcements), number=1, repeat=3))
+                   for fn in (before, after)]
+        print("{:<13} dateutil {:>8.1f} ms   timeutil {:>8.1f} ms   {:>5.1f}x".format(
+            name, timings[0] * 1000, timings[1] * 1000, timings[0] / timings[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Runs every Alexa.Education handler with tracing on against the fake
+# Classroom API, cold and then warm, on each engine, and reads back the
+# metrics line each invocation prints. It checks that the top-level spans
+# never add up to more than the handler's total, which would mean
+# concurrent spans are being counted twice, and that what no span covers
+# stays under MAX_UNACCOUNTED_MS per handler (the median over the
+# invocations, so a stray scheduler pause on a busy machine does not fail
+# it), so the breakdown leaves no stage untimed.
+#
+#   python benchmarks/trace_coverage.py [iterations] [latency_seconds]
+import collections
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ["TRACING_ENABLED"] = "true"
+os.environ.pop("COURSEWORK_INDEX_TABLE", None)
+os.environ.pop("RESPONSE_CACHE_TABLE", None)
+
+from load_test import synthetic_events  # noqa: E402
+from fake_classroom import FakeClassroom, serve  # noqa: E402
+
+MAX_UNACCOUNTED_MS = 0.5
+
+
+def engines():
+    yield "sync"
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return
+    yield "async"
+
+
+def summaries(education, events, iterations):
+    # The summary of every invocation, per namespace, read back from the
+    # metrics lines the handler printed
+    found = collections.defaultdict(list)
+    for _ in range(iterations):
+        for event in events:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                education.handler(event, None)
+            for line in output.getvalue().splitlines():
+                record = json.loads(line)
+                found[record["Handler"]].append(record)
+    return found
+
+
+def main(iterations=10, latency=0.002):
+    # Served over HTTP, which both engines can reach
+    classroom = FakeClassroom(latency=latency)
+    server = serve(classroom)
+    os.environ["CLASSROOM_API_ROOT"] = "http://127.0.0.1:{}/".format(server.server_address[1])
+    from app import announcement_feed, education
+    from app.cache import ResponseCache
+
+    print("{:<6} {:<38} {:>10} {:>10} {:>16}".format(
+        "engine", "handler", "total ms", "spans ms", "unaccounted ms"))
+    for engine in engines():
+        education.ENGINE = engine
+        # Cold for the first iteration, warm for the rest
+        modules = [education, announcement_feed]
+        if engine == "async":
+            from app import aio
+            modules.append(aio)
+        cache = ResponseCache()
+        for module in modules:
+            module.response_cache = cache
+        for namespace, records in summaries(education, synthetic_events(), iterations).items():
+            assert len(records) == iterations, (engine, namespace, len(records))
+            spans = [sum(value for name, value in record.items()
+                         if name.startswith("span.") and "/" not in name) for record in records]
+            unaccounted = [record["unaccounted"] for record in records]
+            for record, top_level in zip(records, spans):
+                assert abs(record["total"] - top_level - record["unaccounted"]) < 1e-6, record
+                assert top_level <= record["total"], (engine, namespace, record)
+            median = statistics.median(unaccounted)
+            print("{:<6} {:<38} {:>10.2f} {:>10.2f} {:>9.3f} (max {:.3f})".format(
+                engine, namespace, statistics.median(r["total"] for r in records),
+                statistics.median(spans), median, max(unaccounted)))
+            assert median < MAX_UNACCOUNTED_MS, (engine, namespace, unaccounted)
+        if engine == "async":
+            aio._loop.run_until_complete(aio._session.close())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(sys.argv[1])] if len(sys.argv) > 1 else [],
+         **{"latency": float(sys.argv[2])} if len(sys.argv) > 2 else {})
@@ -0,0 +1,376 @@
+import asyncio
+import collections
+import hashlib
+import itertools
+import os
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from . import (announcement_feed, classroom, completeness, coursework_index, deadline, education,
+               responses, tracing)
+from .cache import MISSING, response_cache
+from .log import get_logger, log_payload
+from .service import get_service
+
+logger = get_logger(__name__)
+
+# Connections are kept open between warm invocations, since the event loop
+# and the session both live as long as the container.
+POOL_SIZE = int(os.environ.get("AIO_POOL_SIZE", "32"))
+KEEPALIVE_TIMEOUT = float(os.environ.get("AIO_KEEPALIVE_TIMEOUT", "60"))
+REQUEST_TIMEOUT = float(os.environ.get("AIO_REQUEST_TIMEOUT", "10"))
+
+_loop = None
+_session = None
+
+
+def available():
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run(namespace, request, creds, context):
+    # Runs the asyncio version of a handler to completion. The coursework
+    # index is read and written synchronously, so with it switched on the
+    # coursework handlers stay on the synchronous engine.
+    handler = HANDLER_MAP.get(namespace)
+    if handler is None or (namespace in INDEXED_NAMESPACES and coursework_index.enabled()):
+        return education.HANDLER_MAP[namespace](request, creds, context)
+
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    coroutine = handler(request, creds, context)
+    remaining = deadline.remaining()
+    if remaining is not None:
+        # The fetch stages answer with what they have once the deadline
+        # comes (see _by_deadline). This only stops a handler held up
+        # before them, on its user or course list, once the margin kept
+        # for answering has gone as well.
+        coroutine = asyncio.wait_for(coroutine, max(0, remaining) + deadline.MARGIN_MS / 1000)
+    try:
+        return _loop.run_until_complete(coroutine)
+    except asyncio.TimeoutError:
+        # aiohttp raises the same for a request that timed out in time
+        if remaining is None or deadline.remaining() > 0:
+            raise
+        deadline.exhaust(namespace)
+        return responses.build(namespace, [])
+
+
+async def execute(creds, request):
+    # Sends a googleapiclient HttpRequest over the shared aiohttp session
+    # and hands the response to the request's own postproc, so errors and
+    # parsing are exactly those of request.execute().
+    import aiohttp
+
+    global _session
+    if _session is None:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+    headers = dict(request.headers)
+    creds.apply(headers)
+    async with _session.request(request.method, request.uri, data=request.body,
+                                headers=headers) as response:
+        content = await response.read()
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info["status"] = str(response.status)
+    tracing.count("api_calls")
+    return request.postproc(httplib2.Response(info), content)
+
+
+async def _pages(creds, list_next, request, items_key, until=None):
+    # A source's items, page by page, stopping where iter_batched would,
+    # and whether it was read in full. A failed page ends the source and
+    # marks the stage incomplete, as it does in iter_batched.
+    pages = []
+    while request is not None:
+        try:
+            response = await execute(creds, request)
+        except HttpError as e:
+            logger.warning("Request failed: {}".format(e))
+            completeness.mark(items_key)
+            return pages, False
+        items = []
+        for item in response.get(items_key, []):
+            if until is not None and until(item):
+                pages.append(items)
+                return pages, True
+            items.append(item)
+        pages.append(items)
+        request = list_next(request, response)
+    return pages, True
+
+
+async def _by_deadline(awaitable, stage):
+    # What `awaitable` returns, or None if the invocation's deadline comes
+    # first. It is then cancelled, so nothing it fetched is cached, and the
+    # stage is marked out of time.
+    remaining = deadline.remaining()
+    if remaining is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(0, remaining))
+    except asyncio.TimeoutError:
+        deadline.exhaust(stage)
+        return None
+
+
+async def _interleaved(creds, sources, items_key, until=None):
+    # Fetches every source concurrently and returns their items in the
+    # order iter_batched yields them (round by round, sources in order)
+    # and whether every source was read in full.
+    results = await asyncio.gather(*[
+        _pages(creds, list_next, request, items_key, until)
+        for _, list_next, request in sources])
+    per_source = [pages for pages, _ in results]
+    return [item for pages in itertools.zip_longest(*per_source, fillvalue=())
+            for items in pages for item in items], all(complete for _, complete in results)
+
+
+async def _cached(user_id, resource, key, fetch):
+    # `fetch()` returns the value and whether it is complete. Tasks on the
+    # event loop do not get their own completeness scope before Python
+    # 3.7, so this is passed along explicitly, and an incomplete value is
+    # answered with but not cached.
+    value = response_cache.lookup(user_id, resource, key)
+    if value is MISSING:
+        value, complete = await fetch()
+        if complete:
+            response_cache.put(user_id, resource, key, value)
+    return value
+
+
+# The user and course lookups are only awaited one at a time, so their
+# spans nest like the synchronous engine's.
+async def _current_user_id(service, creds):
+    token_hash = hashlib.sha256(creds.token.encode("utf-8")).hexdigest()
+
+    async def fetch():
+        user_profile = await execute(creds, service.userProfiles().get(userId="me"))
+        response_cache.put(user_profile['id'], "profiles", user_profile['id'], user_profile)
+        return user_profile['id'], True
+    with tracing.span("user"):
+        return await _cached(token_hash, "user_id", "me", fetch)
+
+
+async def _cached_courses(service, creds, user_id, student_id):
+    async def fetch():
+        # Unlike the per-course sources, a failure here fails the request
+        # rather than caching a partial course list
+        courses = service.courses()
+        request = courses.list(studentId=student_id, fields=classroom.COURSE_FIELDS)
+        items = []
+        while request is not None:
+            response = await execute(creds, request)
+            items.extend(response.get("courses", []))
+            request = courses.list_next(request, response)
+        return items, True
+    with tracing.span("courses"):
+        return await _cached(user_id, "courses", student_id, fetch)
+
+
+async def _list_courses(service, creds, user_id, student_id):
+    courses = await _cached_courses(service, creds, user_id, student_id)
+    return {c['id']: c['name'] for c in courses}
+
+
+async def _fetch_submissions(service, creds, course_ids, student_id, fields, states):
+    items, complete = await _interleaved(creds, classroom.submission_sources(
+        service, course_ids, student_id, fields, states), "studentSubmissions")
+    all_submissions = collections.defaultdict(list)
+    for submission in items:
+        all_submissions[submission['courseWorkId']].append(submission)
+    return all_submissions, complete
+
+
+async def _fetch_profile(service, creds, user_id, creator_id):
+    try:
+        user_profile = await execute(creds, service.userProfiles().get(
+            userId=creator_id, fields=classroom.PROFILE_NAME_FIELDS))
+    except HttpError as e:
+        logger.warning("Profile lookup failed for {}: {}".format(creator_id, e))
+        return None
+    response_cache.put(user_id, "profiles", creator_id, user_profile)
+    return user_profile
+
+
+async def student_profile_handler(request, creds, context):
+    service = get_service(creds)
+    user_id = await _current_user_id(service, creds)
+
+    async def fetch():
+        return await execute(creds, service.userProfiles().get(userId=user_id)), True
+    user_profile = await _cached(user_id, "profiles", user_id, fetch)
+    return education.student_profile_response(user_profile)
+
+
+async def course_handler(request, creds, context):
+    service = get_service(creds)
+    student_id = request['query']['matchAll']['studentId']
+    max_results = request['paginationContext']['maxResults']
+    user_id = await _current_user_id(service, creds)
+    course_list = await _cached_courses(service, creds, user_id, student_id)
+    return education.course_response(course_list[:max_results])
+
+
+async def coursework_handler(request, creds, context):
+    service = get_service(creds)
+    student_id = request['query']['matchAll']['studentId']
+    user_id = await _current_user_id(service, creds)
+    all_courses = await _list_courses(service, creds, user_id, student_id)
+    log_payload(logger, "Courses", all_courses)
+
+    due_time = request['query']['matchAll']['dueTime']
+    start_key, end_key = classroom.due_window(due_time)
+    max_results = request['paginationContext']['maxResults']
+
+    async def fetch_due_course_works():
+        course_works, complete = await _interleaved(creds, classroom.course_work_sources(
+            service, all_courses, classroom.DUE_COURSE_WORK_FIELDS,
+            pageSize=classroom.COURSE_WORK_PAGE_SIZE
+        ), "courseWork", until=classroom.before_window(start_key))
+        return classroom.earliest_due(course_works, start_key, end_key,
+                                      max_results), complete
+
+    def fetch_submissions():
+        return _fetch_submissions(service, creds, all_courses, student_id,
+                                  classroom.SUBMISSION_STATE_FIELDS, classroom.SUBMITTED_STATES)
+
+    cache_key = [student_id, due_time['start'], due_time['end'], max_results,
+                 sorted(all_courses)]
+    submissions_key = [student_id, "submitted", sorted(all_courses)]
+    with tracing.span("fetch"):
+        due_course_works, all_submissions = await asyncio.gather(
+            _by_deadline(_cached(user_id, "course_works", cache_key, fetch_due_course_works),
+                         "courseWork"),
+            _by_deadline(_cached(user_id, "submissions", submissions_key, fetch_submissions),
+                         "studentSubmissions"))
+    due_course_works = education.in_time(due_course_works, "courseWork", [], user_id,
+                                         "course_works", cache_key)
+    all_submissions, submissions_known = education.in_time_complete(
+        all_submissions, "studentSubmissions", {}, user_id, "submissions", submissions_key)
+    return education.coursework_response(
+        due_course_works, all_submissions, all_courses, submissions_known)
+
+
+async def coursework_grade_handler(request, creds, context):
+    service = get_service(creds)
+    max_results = request['paginationContext']['maxResults']
+
+    query = request['query']['matchAll']
+    student_id = query['studentId']
+    user_id = await _current_user_id(service, creds)
+    if 'courseId' in query:
+        course = await execute(creds, service.courses().get(id=query['courseId'], fields="id,name"))
+        all_courses = {course["id"]: course["name"]}
+    else:
+        all_courses = await _list_courses(service, creds, user_id, student_id)
+
+    async def fetch_course_works():
+        course_works, complete = await _interleaved(creds, classroom.course_work_sources(
+            service, all_courses, classroom.GRADE_COURSE_WORK_FIELDS), "courseWork")
+        return {course_work['id']: course_work for course_work in course_works}, complete
+
+    def fetch_submissions():
+        return _fetch_submissions(service, creds, all_courses, student_id,
+                                  classroom.GRADED_SUBMISSION_FIELDS, classroom.GRADED_STATES)
+
+    submissions_key = [student_id, "graded", sorted(all_courses)]
+    with tracing.span("fetch"):
+        all_course_works, all_submissions = await asyncio.gather(
+            _by_deadline(_cached(user_id, "course_works", sorted(all_courses),
+                                 fetch_course_works), "courseWork"),
+            _by_deadline(_cached(user_id, "submissions", submissions_key, fetch_submissions),
+                         "studentSubmissions"))
+    all_course_works = education.in_time(all_course_works, "courseWork", {}, user_id,
+                                         "course_works", sorted(all_courses))
+    all_submissions = education.in_time(all_submissions, "studentSubmissions", {}, user_id,
+                                        "submissions", submissions_key)
+    return education.grade_response(all_course_works, all_submissions, all_courses, student_id,
+                                     max_results)
+
+
+async def announcements_handler(request, creds, context):
+    max_results = request['paginationContext']['maxResults']
+    student_id = request['query']['matchAll'].get('studentId', "me")
+
+    service = get_service(creds)
+    user_id = await _current_user_id(service, creds)
+    course_ids = list(await _list_courses(service, creds, user_id, student_id))
+
+    with tracing.span("announcements"):
+        # Reading the feeds and building the collection belong to the
+        # stage, as they do in announcement_feed.recent
+        refresh = announcement_feed.Refresh(user_id, course_ids, max_results)
+        announcements = service.courses().announcements()
+    cached_users = {}
+    profile_lookups = {}
+
+    def look_up_creators(course_announcements):
+        creator_ids = set(a['creatorUserId'] for a in course_announcements)
+        creator_ids.difference_update(cached_users, profile_lookups)
+        cached_users.update(response_cache.get_many(user_id, "profiles", creator_ids))
+        for creator_id in creator_ids.difference(cached_users):
+            profile_lookups[creator_id] = asyncio.ensure_future(
+                _fetch_profile(service, creds, user_id, creator_id))
+
+    async def course_feed(course_id):
+        # refresh.seen counts what the course has fetched so far, so items
+        # are recorded as they are read
+        request = refresh.request(announcements, course_id)
+        while request is not None:
+            try:
+                response = await execute(creds, request)
+            except HttpError as e:
+                # The feed is then not stored, as in the sync path
+                logger.warning("Request failed: {}".format(e))
+                completeness.mark("announcements")
+                break
+            for announcement in response.get("announcements", []):
+                if refresh.seen(announcement):
+                    request = None
+                    break
+                refresh.fetched[course_id].append(announcement)
+            else:
+                request = announcements.list_next(request, response)
+        # Only this course's newest maxResults can make the response, so
+        # their creators are looked up while other courses still load
+        look_up_creators(refresh.feed(user_id, course_id)[:max_results])
+
+    with tracing.span("announcements"):
+        # Courses cut short by the deadline answer with what they read
+        await _by_deadline(asyncio.gather(*[course_feed(course_id) for course_id in course_ids]),
+                           "announcements")
+        all_announcements = refresh.finish(user_id, course_ids, max_results)
+    log_payload(logger, "Announcements", all_announcements)
+
+    with tracing.span("profiles"):
+        look_up_creators(all_announcements)
+        # A creator whose profile is not back by the deadline is announced
+        # without a name
+        if profile_lookups:
+            await _by_deadline(asyncio.wait(list(profile_lookups.values())), "profiles")
+    all_users = dict(cached_users)
+    for creator_id, lookup in profile_lookups.items():
+        if not lookup.done():
+            lookup.cancel()
+        elif lookup.result():
+            all_users[creator_id] = lookup.result()
+    return education.announcements_response(all_announcements, all_users)
+
+
+HANDLER_MAP = {
+    education.STUDENT_PROFILE_NAMESPACE: student_profile_handler,
+    education.COURSEWORK_NAMESPACE: coursework_handler,
+    education.ANNOUNCEMENTS_NAMESPACE: announcements_handler,
+    education.COURSE_NAMESPACE: course_handler,
+    education.COURSE_WORK_GRADE_NAMESPACE: coursework_grade_handler
+}
+INDEXED_NAMESPACES = {education.COURSEWORK_NAMESPACE, education.COURSE_WORK_GRADE_NAMESPACE}
@@ -0,0 +1,110 @@
+import collections
+import heapq
+import itertools
+import os
+
+from . import completeness, timeutil
+from .cache import response_cache
+from .log import get_logger, log_fields
+from .paging import iter_batched
+
+logger = get_logger(__name__)
+
+# Announcements kept per course. A request for more than this many
+# rebuilds the courses whose buffer is full.
+FEED_SIZE = int(os.environ.get("ANNOUNCEMENT_FEED_SIZE", "20"))
+WINDOW_DAYS = 7
+ANNOUNCEMENT_FIELDS = "nextPageToken,announcements(id,courseId,creatorUserId,text,updateTime)"
+
+
+def _update_key(announcement):
+    return timeutil.timestamp_key(announcement['updateTime'])
+
+
+class Refresh:
+    # One request's pass over the feeds: which ones are usable, how far
+    # back each course has to be listed and what has been fetched so far.
+    # The sync path below and the asyncio engine both drive it.
+    __slots__ = ("cutoff_key", "capacity", "feeds", "bounds", "fetched", "merged")
+
+    def __init__(self, user_id, course_ids, max_results):
+        self.cutoff_key = timeutil.days_ago_key(WINDOW_DAYS)
+        self.capacity = max(FEED_SIZE, max_results)
+        self.feeds = response_cache.get_many(user_id, "announcement_feeds", course_ids)
+        for course_id, feed in list(self.feeds.items()):
+            if len(feed["recent"]) >= feed["size"] and feed["size"] < max_results:
+                # Older announcements may have been dropped from a full buffer
+                del self.feeds[course_id]
+
+        self.bounds = {}
+        for course_id in course_ids:
+            feed = self.feeds.get(course_id)
+            mark_key = timeutil.timestamp_key(feed["mark"]) if feed and feed["mark"] \
+                else self.cutoff_key
+            self.bounds[course_id] = max(mark_key, self.cutoff_key)
+        self.fetched = collections.defaultdict(list)
+        self.merged = {}
+
+    def request(self, announcements, course_id):
+        return announcements.list(courseId=course_id, orderBy="updateTime desc",
+                                  pageSize=self.capacity, fields=ANNOUNCEMENT_FIELDS)
+
+    def seen(self, announcement):
+        # Newest first, so a course is done at the first announcement
+        # already in its feed (or outside the window), or once it has
+        # filled a buffer
+        course_id = announcement['courseId']
+        return _update_key(announcement) < self.bounds[course_id] \
+            or len(self.fetched[course_id]) >= self.capacity
+
+    def feed(self, user_id, course_id):
+        # The course's buffer with what was fetched for it in front, stored
+        # back if it changed. Call once the course is done fetching.
+        if course_id not in self.merged:
+            feed = self.feeds.get(course_id)
+            if feed is None or self.fetched[course_id]:
+                feed = _advance(feed, self.fetched[course_id], self.capacity)
+                # A course cut short by the deadline is missing what lies
+                # between its last page and its mark, so it is not stored
+                if not completeness.incomplete("announcements"):
+                    response_cache.put(user_id, "announcement_feeds", course_id, feed)
+            self.merged[course_id] = [
+                a for a in feed["recent"] if _update_key(a) >= self.cutoff_key]
+        return self.merged[course_id]
+
+    def finish(self, user_id, course_ids, max_results):
+        merged = [self.feed(user_id, course_id) for course_id in course_ids]
+        log_fields(logger, "Announcement feeds", courses=len(course_ids), cached=len(self.feeds),
+                   fetched=sum(len(items) for items in self.fetched.values()))
+        return list(itertools.islice(
+            heapq.merge(*merged, key=_update_key, reverse=True), max_results))
+
+
+def recent(service, user_id, course_ids, max_results):
+    # Each course's feed is {"mark", "size", "recent"}: the newest
+    # updateTime seen, the buffer capacity and up to that many
+    # announcements, newest first. Only announcements updated since the
+    # mark are fetched. They go to the front of the buffer and the oldest
+    # fall off the end. The feeds are then merged newest first.
+    refresh = Refresh(user_id, course_ids, max_results)
+    announcements = service.courses().announcements()
+    for course_id, announcement in iter_batched(service, [
+        (course_id, announcements.list_next, refresh.request(announcements, course_id))
+        for course_id in course_ids
+    ], "announcements", until=refresh.seen):
+        refresh.fetched[course_id].append(announcement)
+    return refresh.finish(user_id, course_ids, max_results)
+
+
+def _advance(feed, new_announcements, capacity):
+    # An edited announcement comes back with a newer updateTime, so its
+    # older copy is dropped from the buffer
+    new_ids = set(a['id'] for a in new_announcements)
+    previous = [a for a in feed["recent"] if a['id'] not in new_ids] if feed else []
+    ring = collections.deque(previous, maxlen=capacity)
+    ring.extendleft(reversed(new_announcements))
+    if ring:
+        mark = ring[0]['updateTime']
+    else:
+        mark = feed["mark"] if feed else None
+    return {"mark": mark, "size": capacity, "recent": list(ring)}
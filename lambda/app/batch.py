@@ -0,0 +1,224 @@
+import concurrent.futures
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from . import deadline as invocation_deadline
+from .log import get_logger, log_fields, log_payload
+from .service import authorized_http
+from .tracing import count, span, traced
+
+logger = get_logger(__name__)
+
+# Sub-requests per batch, starting from (and never above) BATCH_SIZE.
+# Classroom answers much larger batches with rateLimitExceeded. A round
+# that gets throttled halves the size for the rest of the container's
+# life; every clean round grows it back by BATCH_SIZE_STEP.
+BATCH_SIZE = int(os.environ.get("CLASSROOM_BATCH_SIZE", "50"))
+MIN_BATCH_SIZE = int(os.environ.get("CLASSROOM_MIN_BATCH_SIZE", "5"))
+BATCH_SIZE_STEP = int(os.environ.get("CLASSROOM_BATCH_SIZE_STEP", "5"))
+MAX_CONCURRENT_BATCHES = int(os.environ.get("CLASSROOM_MAX_CONCURRENT_BATCHES", "4"))
+# Failed sub-requests are retried with jittered exponential backoff, but
+# never past the deadline (the invocation's unless one is given); outside
+# an invocation the retries get RETRY_BUDGET seconds.
+MAX_ATTEMPTS = int(os.environ.get("CLASSROOM_BATCH_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("CLASSROOM_BATCH_RETRY_BASE_DELAY", "0.25"))
+RETRY_BUDGET = float(os.environ.get("CLASSROOM_BATCH_RETRY_BUDGET", "3"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+@traced("fetch")
+def run_concurrently(creds, *fetches):
+    # Each fetch is called with its own `http` so it never shares a
+    # service's transport with another thread, and in a copy of the
+    # caller's context so it sees the invocation's deadline and trace. The
+    # connections underneath come from the shared pool. Results come back
+    # in argument order, with None for a fetch still running when the
+    # invocation's deadline comes; it is left to stop at its next page, and
+    # the "fetch" stage is marked as out of time.
+    if len(fetches) == 1:
+        return [fetches[0]()]
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(fetches))
+    futures = [executor.submit(contextvars.copy_context().run, fetch, http=authorized_http(creds))
+               for fetch in fetches]
+    remaining = invocation_deadline.remaining()
+    done, _ = concurrent.futures.wait(
+        futures, timeout=max(0, remaining) if remaining is not None else None)
+    executor.shutdown(wait=False)
+    if len(done) < len(futures):
+        invocation_deadline.exhaust("fetch")
+    return [future.result() if future in done else None for future in futures]
+
+
+def run_in_time(creds, stage, fetch):
+    # A single fetch bounded by the invocation's deadline like those of
+    # run_concurrently: None, with `stage` marked out of time, if it is
+    # still running when the deadline comes. Outside an invocation it just
+    # runs here.
+    remaining = invocation_deadline.remaining()
+    if remaining is None:
+        return fetch()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(contextvars.copy_context().run, fetch, http=authorized_http(creds))
+    executor.shutdown(wait=False)
+    try:
+        return future.result(timeout=max(0, remaining))
+    except concurrent.futures.TimeoutError:
+        invocation_deadline.exhaust(stage)
+        return None
+
+
+class _AdaptiveSize:
+    def __init__(self, maximum, minimum, step):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.step = step
+        self.value = maximum
+        self._lock = threading.Lock()
+
+    def record(self, throttled):
+        with self._lock:
+            if throttled:
+                self.value = max(self.minimum, self.value // 2)
+            else:
+                self.value = min(self.maximum, self.value + self.step)
+
+
+batch_size = _AdaptiveSize(BATCH_SIZE, MIN_BATCH_SIZE, BATCH_SIZE_STEP)
+
+
+class BatchResult:
+    # `responses` and `failures` are keyed like the requests; a key is in
+    # exactly one of them. `retried` counts sub-requests sent again and
+    # `throttled` the rate-limit answers seen along the way.
+    __slots__ = ("responses", "failures", "retried", "throttled")
+
+    def __init__(self):
+        self.responses = {}
+        self.failures = {}
+        self.retried = 0
+        self.throttled = 0
+
+    @property
+    def complete(self):
+        return not self.failures
+
+
+def execute(service, requests, missing_ok=False, deadline=None, http=None):
+    # `requests` maps keys to API requests. They are sent in batches of the
+    # current adaptive size, up to MAX_CONCURRENT_BATCHES at a time, and
+    # the sub-requests that failed with a retryable status are sent again.
+    # `deadline` is a time.monotonic() value. With `missing_ok` a 404
+    # counts as an empty success, which is what deleting something already
+    # gone wants.
+    result = BatchResult()
+    if deadline is None:
+        deadline = invocation_deadline.expires_at() or time.monotonic() + RETRY_BUDGET
+    pending = dict(requests)
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            delay = RETRY_BASE_DELAY * (2 ** (attempt - 1)) * (1 + random.random())
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+            result.retried += len(pending)
+            count("retried_requests", len(pending))
+
+        failures = {}
+        size = batch_size.value
+        keys = list(pending)
+        chunks = [{key: pending[key] for key in keys[i:i + size]}
+                  for i in range(0, len(keys), size)]
+        for responses, chunk_failures in _execute_chunks(service, chunks, missing_ok, http):
+            result.responses.update(responses)
+            failures.update(chunk_failures)
+
+        throttled = sum(1 for exception in failures.values() if _throttled(exception))
+        batch_size.record(throttled)
+        result.throttled += throttled
+        pending = {}
+        for key, exception in failures.items():
+            if _retryable(exception):
+                pending[key] = requests[key]
+            result.failures[key] = exception
+        for key in result.responses:
+            result.failures.pop(key, None)
+        if not pending:
+            break
+
+    if result.failures or result.retried:
+        count("failed_requests", len(result.failures))
+        log_fields(logger, "Batch incomplete" if result.failures else "Batch recovered",
+                   requests=len(requests), failed=len(result.failures), retried=result.retried,
+                   throttled=result.throttled, batch_size=batch_size.value,
+                   error=str(next(iter(result.failures.values()), "")))
+    return result
+
+
+def _execute_chunks(service, chunks, missing_ok, http):
+    # The transport underneath is the shared pool, which is safe to use
+    # from several threads at once. A context can only be entered by one
+    # thread at a time, so every chunk runs in its own copy.
+    if len(chunks) <= 1:
+        return [_execute_batch(service, chunk, missing_ok, http) for chunk in chunks]
+    workers = min(MAX_CONCURRENT_BATCHES, len(chunks))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, _execute_batch, service,
+                                   chunk, missing_ok, http)
+                   for chunk in chunks]
+        return [future.result() for future in futures]
+
+
+def _execute_batch(service, requests, missing_ok, http=None):
+    responses, failures = {}, {}
+    keys = list(requests)
+
+    def callback(request_id, response, exception):
+        key = keys[int(request_id)]
+        if exception is None:
+            log_payload(logger, "Batch response", response, request_id=request_id)
+            responses[key] = response
+        elif missing_ok and isinstance(exception, HttpError) and exception.resp.status == 404:
+            responses[key] = {}
+        else:
+            failures[key] = exception
+
+    batch = service.new_batch_http_request(callback=callback)
+    for index, key in enumerate(keys):
+        batch.add(requests[key], request_id=str(index))
+    try:
+        with span("batch"):
+            batch.execute(http=http)
+    except HttpError as e:
+        # The whole batch failed, so every sub-request failed with it
+        failures.update((key, e) for key in keys)
+    count("batches")
+    count("api_calls", len(keys))
+    return responses, failures
+
+
+def _reason(exception):
+    try:
+        return json.loads(exception.content)["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def _throttled(exception):
+    if not isinstance(exception, HttpError):
+        return False
+    return exception.resp.status == 429 or (
+        exception.resp.status == 403 and _reason(exception) in RATE_LIMIT_REASONS)
+
+
+def _retryable(exception):
+    return isinstance(exception, HttpError) and (
+        exception.resp.status in RETRYABLE_STATUSES or _throttled(exception))
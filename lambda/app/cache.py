@@ -0,0 +1,161 @@
+import collections
+import json
+import os
+import threading
+import time
+
+import cachetools
+
+from . import codec, completeness, tracing
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds each resource type stays cached. Every entry can be overridden
+# with a CACHE_TTL_<RESOURCE> environment variable.
+DEFAULT_TTLS = {
+    "user_id": 55 * 60,
+    "profiles": 24 * 60 * 60,
+    "courses": 6 * 60 * 60,
+    "course_works": 15 * 60,
+    # Submission states change as the student works, so these are kept
+    # briefly; past that they only stand in when the deadline comes first
+    "submissions": 2 * 60,
+    # Incremental feeds only hold the last week anyway
+    "announcement_feeds": 7 * 24 * 60 * 60,
+}
+DEFAULT_MAXSIZE = 512
+
+# What lookup() returns for a key that is not cached, since None can be a
+# cached value
+MISSING = object()
+
+
+def _configured_ttls(ttls):
+    configured = dict(DEFAULT_TTLS, **(ttls or {}))
+    for resource in configured:
+        override = os.environ.get("CACHE_TTL_" + resource.upper())
+        if override:
+            configured[resource] = int(override)
+    return configured
+
+
+class ResponseCache:
+    def __init__(self, ttls=None, maxsize=DEFAULT_MAXSIZE, model=None):
+        self.ttls = _configured_ttls(ttls)
+        self.model = model
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+        self._caches = {resource: cachetools.TTLCache(maxsize, ttl)
+                        for resource, ttl in self.ttls.items()}
+        self._stale = cachetools.LRUCache(maxsize)
+
+    @staticmethod
+    def key(user_id, resource, key):
+        if not isinstance(key, str):
+            key = json.dumps(key, sort_keys=True)
+        return "#".join((user_id, resource, key))
+
+    def lookup(self, user_id, resource, key):
+        cache_key = self.key(user_id, resource, key)
+        with self._lock:
+            value = self._caches[resource].get(cache_key, MISSING)
+        if value is not MISSING:
+            self._count(resource, "memory.hit")
+            return value
+        self._count(resource, "memory.miss")
+
+        if self.model is None:
+            return MISSING
+        value = self._load(cache_key)
+        if value is MISSING:
+            self._count(resource, "dynamodb.miss")
+        else:
+            self._count(resource, "dynamodb.hit")
+            with self._lock:
+                self._caches[resource][cache_key] = value
+        return value
+
+    def put(self, user_id, resource, key, value):
+        cache_key = self.key(user_id, resource, key)
+        with self._lock:
+            self._caches[resource][cache_key] = value
+            self._stale[cache_key] = value
+        if self.model is not None:
+            self._store(cache_key, value, self.ttls[resource])
+
+    def get(self, user_id, resource, key, fetch, **kwargs):
+        value = self.lookup(user_id, resource, key)
+        if value is MISSING:
+            # A fetch cut short by the deadline, even one that only finishes
+            # after the invocation has answered, is incomplete
+            with completeness.scope() as scope:
+                value = fetch(**kwargs)
+            if not scope.incomplete():
+                self.put(user_id, resource, key, value)
+        return value
+
+    def stale(self, user_id, resource, key):
+        # The last value stored for the key, expired or not, for when the
+        # deadline leaves nothing better. None if there is none.
+        cache_key = self.key(user_id, resource, key)
+        with self._lock:
+            value = self._caches[resource].get(cache_key, MISSING)
+            if value is MISSING:
+                value = self._stale.get(cache_key, MISSING)
+        if value is MISSING and self.model is not None:
+            value = self._load(cache_key, expired_ok=True)
+        if value is MISSING:
+            return None
+        self._count(resource, "stale")
+        return value
+
+    def get_many(self, user_id, resource, keys):
+        found = {}
+        for key in keys:
+            value = self.lookup(user_id, resource, key)
+            if value is not MISSING:
+                found[key] = value
+        return found
+
+    def _count(self, resource, outcome):
+        # Kept for the life of the container in `stats`, and per invocation
+        # as trace counters, which reach CloudWatch with the handler's
+        # metrics as count.cache.<resource>.<outcome>
+        name = resource + "." + outcome
+        self.stats[name] += 1
+        tracing.count("cache." + name)
+
+    def _load(self, cache_key, expired_ok=False):
+        from pynamodb.exceptions import PynamoDBException
+        try:
+            item = self.model.get(cache_key)
+        except self.model.DoesNotExist:
+            return MISSING
+        except PynamoDBException as e:
+            logger.warning("Response cache read failed for {}: {}".format(cache_key, e))
+            return MISSING
+        # DynamoDB only sweeps expired items eventually
+        if item.expires_at <= time.time() and not expired_ok:
+            return MISSING
+        return codec.loads(item.payload)
+
+    def _store(self, cache_key, value, ttl):
+        from pynamodb.exceptions import PynamoDBException
+        try:
+            self.model(cache_key, payload=codec.dumps(value),
+                       expires_at=int(time.time()) + ttl).save()
+        except PynamoDBException as e:
+            logger.warning("Response cache write failed for {}: {}".format(cache_key, e))
+
+
+def _table_model():
+    # pynamodb (and with it botocore) is only imported when the DynamoDB
+    # tier is switched on.
+    if not os.environ.get("RESPONSE_CACHE_TABLE"):
+        return None
+    from .tables import CachedResponse
+    return CachedResponse
+
+
+response_cache = ResponseCache(model=_table_model())
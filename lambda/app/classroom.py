@@ -0,0 +1,139 @@
+import collections
+import functools
+import heapq
+
+from . import coursework_index
+from . import timeutil
+from .batch import run_concurrently
+from .paging import iter_batched, iter_items, token_pager
+from . import tracing
+
+# What the Alexa.Education handlers read from Classroom, shared by the
+# synchronous handlers in education.py and the asyncio engine in aio.py.
+
+# Every list call names the fields its handler reads, and submissions are
+# filtered by state on the server, so pages only carry what is used.
+DUE_COURSE_WORK_FIELDS = "nextPageToken,courseWork(id,workType,courseId,dueDate,dueTime,title,description,creationTime)"
+GRADE_COURSE_WORK_FIELDS = "nextPageToken,courseWork(id,title,maxPoints)"
+SUBMISSION_STATE_FIELDS = "nextPageToken,studentSubmissions(courseWorkId,state)"
+GRADED_SUBMISSION_FIELDS = "nextPageToken,studentSubmissions(courseId,courseWorkId,assignedGrade,updateTime)"
+INDEX_SUBMISSION_FIELDS = "nextPageToken,studentSubmissions({})".format(
+    ",".join(coursework_index.SUBMISSION_KEYS))
+SUBMITTED_STATES = ("TURNED_IN", "RETURNED")
+# A graded submission the student turns in again is TURNED_IN but keeps
+# its assignedGrade, which grades.latest_grades checks for
+GRADED_STATES = ("RETURNED", "TURNED_IN")
+# Large enough that coursework due after the window rarely costs a page of
+# its own, whatever maxResults the request asks for.
+COURSE_WORK_PAGE_SIZE = 100
+COURSE_FIELDS = "nextPageToken,courses(id,name,description)"
+PROFILE_NAME_FIELDS = "id,name"
+
+
+def fetch_courses(service, student_id, http=None):
+    courses = service.courses()
+    request = courses.list(studentId=student_id, fields=COURSE_FIELDS)
+    return list(iter_items(courses, request, "courses", http=http))
+
+
+def due_window(due_time):
+    # Due dates are compared as minute keys, so the window is converted
+    # once here instead of building a datetime per coursework
+    start_key = timeutil.datetime_minute_key(timeutil.parse(due_time['start']), round_up=True)
+    end_key = timeutil.datetime_minute_key(timeutil.parse(due_time['end']))
+    return start_key, end_key
+
+
+def _due_key(course_work):
+    due_date = course_work['dueDate']
+    due_time = course_work.get('dueTime', {})
+    return timeutil.minute_key(due_date['year'], due_date['month'], due_date['day'],
+                               due_time.get('hours', 0), due_time.get('minutes', 0))
+
+
+# The *_sources helpers build the (key, list_next, request) list sources
+# both engines page through.
+def course_work_sources(service, course_ids, fields, **kwargs):
+    course_works = service.courses().courseWork()
+    return [
+        (course_id, course_works.list_next, course_works.list(
+            courseId=course_id, orderBy="dueDate desc", fields=fields, **kwargs))
+        for course_id in course_ids
+    ]
+
+
+def submission_sources(service, course_ids, student_id, fields, states=None):
+    submissions = service.courses().courseWork().studentSubmissions()
+    query = {"courseWorkId": "-", "userId": student_id, "fields": fields}
+    if states:
+        query["states"] = list(states)
+    return [
+        (course_id, token_pager(submissions.list, courseId=course_id, **query),
+         submissions.list(courseId=course_id, **query))
+        for course_id in course_ids
+    ]
+
+
+@tracing.traced("course_works")
+def fetch_course_works(service, course_ids, fields, http=None):
+    items = iter_batched(service, course_work_sources(service, course_ids, fields),
+                         "courseWork", http=http)
+    return {course_work['id']: course_work for _, course_work in items}
+
+
+@tracing.traced("course_works")
+def fetch_due_course_works(service, course_ids, start_key, end_key, max_results, http=None):
+    items = iter_batched(service, course_work_sources(
+        service, course_ids, DUE_COURSE_WORK_FIELDS, pageSize=COURSE_WORK_PAGE_SIZE
+    ), "courseWork", until=before_window(start_key), http=http)
+    return earliest_due((course_work for _, course_work in items), start_key, end_key,
+                        max_results)
+
+
+def before_window(start_key):
+    # Coursework is listed by descending due date, so a course stops paging
+    # as soon as it reaches a due date before the window. What is read then
+    # grows with the window rather than with the course history, and items
+    # past the first page are still found.
+    start_date = start_key // 10000
+
+    def before_window(course_work):
+        return "dueDate" in course_work and _due_key(course_work) // 10000 < start_date
+    return before_window
+
+
+def due_in_window(course_works, start_key, end_key):
+    # Apparently there is a difference between how Alexa counts as
+    # "today" and how google counts as "today"
+    return (
+        course_work for course_work in course_works
+        if course_work.get("workType", "") == "ASSIGNMENT" and "dueDate" in course_work
+        and start_key <= _due_key(course_work) <= end_key)
+
+
+def earliest_due(course_works, start_key, end_key, max_results):
+    # The max_results due soonest in the window, soonest first. Courses
+    # arrive interleaved, each latest due first, so what comes first is
+    # not what is due first.
+    return heapq.nsmallest(max_results, due_in_window(course_works, start_key, end_key),
+                           key=_due_key)
+
+
+def fetch_course_data(service, creds, student_id, course_ids):
+    return run_concurrently(
+        creds,
+        functools.partial(fetch_course_works, service, course_ids,
+                          coursework_index.COURSE_WORK_FIELDS),
+        functools.partial(fetch_submissions, service, course_ids, student_id,
+                          INDEX_SUBMISSION_FIELDS))
+
+
+@tracing.traced("submissions")
+def fetch_submissions(service, course_ids, student_id, fields, states=None, http=None):
+    items = iter_batched(service, submission_sources(
+        service, course_ids, student_id, fields, states), "studentSubmissions", http=http)
+
+    all_submissions = collections.defaultdict(list)
+    for _, submission in items:
+        all_submissions[submission['courseWorkId']].append(submission)
+    return all_submissions
@@ -0,0 +1,23 @@
+import json
+
+# JSON for the payloads this code stores itself (the response cache, the
+# single-flight table and the coursework index) and for checking
+# responses. orjson encodes large coursework lists several times faster
+# than the standard library, so it is used when it is installed; the
+# output of either decodes with the other.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value).decode("utf-8")
+
+    loads = orjson.loads
+else:
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":"))
+
+    loads = json.loads
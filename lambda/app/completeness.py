@@ -0,0 +1,48 @@
+import contextlib
+import contextvars
+
+# Which stages of the work in progress came back incomplete, because the
+# deadline cut them short or a source failed for good. Every fetch whose
+# result may be cached or shared runs in its own scope, so the decision
+# to keep it rests on that fetch alone, however late it finishes. A stage
+# marked in a scope is marked in every enclosing one too, up to the
+# invocation's, which decides whether to answer from a stale copy. Worker
+# threads run in a copy of the submitting context and so mark the scope
+# that submitted them.
+_current = contextvars.ContextVar("completeness", default=None)
+
+
+class Scope:
+    __slots__ = ("parent", "stages")
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.stages = []
+
+    def incomplete(self, stage=None):
+        return stage in self.stages if stage is not None else bool(self.stages)
+
+
+@contextlib.contextmanager
+def scope():
+    current = Scope(_current.get())
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def mark(stage):
+    current = _current.get()
+    while current is not None:
+        if stage not in current.stages:
+            current.stages.append(stage)
+        current = current.parent
+
+
+def incomplete(stage=None):
+    # Whether `stage`, or with no stage any stage, of the current scope is
+    # incomplete. False outside any scope.
+    current = _current.get()
+    return current is not None and current.incomplete(stage)
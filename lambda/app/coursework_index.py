@@ -0,0 +1,123 @@
+import collections
+import os
+import time
+
+from . import codec, completeness
+from .log import get_logger, log_fields
+from .tracing import traced
+
+logger = get_logger(__name__)
+
+# Entries older than this are refetched even without a change notification,
+# since registrations expire and Pub/Sub delivery is not guaranteed.
+INDEX_MAX_AGE = int(os.environ.get("COURSEWORK_INDEX_MAX_AGE", 6 * 60 * 60))
+
+COURSE_WORK_FIELDS = "nextPageToken,courseWork(id,workType,courseId,dueDate,dueTime,title,description,creationTime,maxPoints)"
+SUBMISSION_KEYS = ("id", "courseId", "courseWorkId", "state", "assignedGrade", "updateTime")
+
+
+def enabled():
+    return bool(os.environ.get("COURSEWORK_INDEX_TABLE"))
+
+
+def student_key(user_id, student_id):
+    return "{}#{}".format(user_id, student_id)
+
+
+# The table model is imported inside each function so that importing this
+# module stays cheap while the index is switched off.
+def load(key, course_ids):
+    from .tables import CourseworkIndexEntry, PynamoDBException
+    entries = {}
+    try:
+        for entry in CourseworkIndexEntry.batch_get([(key, c) for c in course_ids]):
+            if not entry.stale and entry.refreshed_at > time.time() - INDEX_MAX_AGE:
+                entries[entry.course_id] = entry
+    except PynamoDBException as e:
+        logger.warning("Coursework index read failed for {}: {}".format(key, e))
+    return entries
+
+
+def store(key, course_ids, all_course_works, all_submissions):
+    from .tables import CourseworkIndexEntry, PynamoDBException
+    course_works = collections.defaultdict(list)
+    for course_work in all_course_works.values():
+        course_works[course_work['courseId']].append(course_work)
+    submissions = collections.defaultdict(list)
+    for course_work_submissions in all_submissions.values():
+        for submission in course_work_submissions:
+            submissions[submission['courseId']].append(
+                {k: submission[k] for k in SUBMISSION_KEYS if k in submission})
+
+    refreshed_at = int(time.time())
+    try:
+        with CourseworkIndexEntry.batch_write() as batch:
+            for course_id in course_ids:
+                batch.save(CourseworkIndexEntry(
+                    key, course_id,
+                    course_works=codec.dumps(course_works[course_id]),
+                    submissions=codec.dumps(submissions[course_id]),
+                    refreshed_at=refreshed_at,
+                    stale=False))
+    except PynamoDBException as e:
+        logger.warning("Coursework index write failed for {}: {}".format(key, e))
+
+
+@traced("index")
+def course_data(key, course_ids, fetch):
+    # Answers from the index where it is fresh and calls
+    # `fetch(stale_course_ids)` -> (all_course_works, all_submissions) for
+    # the rest, writing what it gets back into the index.
+    entries = load(key, course_ids)
+    all_course_works = {}
+    all_submissions = collections.defaultdict(list)
+    for entry in entries.values():
+        for course_work in codec.loads(entry.course_works):
+            all_course_works[course_work['id']] = course_work
+        for submission in codec.loads(entry.submissions):
+            all_submissions[submission['courseWorkId']].append(submission)
+
+    stale_course_ids = [c for c in course_ids if c not in entries]
+    log_fields(logger, "Coursework index lookup", fresh=len(entries),
+               refreshed=len(stale_course_ids))
+    if stale_course_ids:
+        # Either part is None if the deadline came first, and a part that
+        # is incomplete is not indexed
+        with completeness.scope() as scope:
+            fetched_course_works, fetched_submissions = fetch(stale_course_ids)
+        if not scope.incomplete():
+            store(key, stale_course_ids, fetched_course_works, fetched_submissions)
+        all_course_works.update(fetched_course_works or {})
+        for course_work_id, submissions in (fetched_submissions or {}).items():
+            all_submissions[course_work_id].extend(submissions)
+    return all_course_works, all_submissions
+
+
+def apply_change(notification):
+    from .tables import CourseworkIndexEntry
+    collection = notification['collection']
+    event_type = notification['eventType']
+    resource_id = notification['resourceId']
+    course_id = resource_id['courseId']
+
+    for key in CourseworkIndexEntry.by_course.query(course_id):
+        if collection == "courses.courseWork" and event_type == "DELETED":
+            _remove_course_work(key.student_key, course_id, resource_id['id'])
+        else:
+            # Notifications only carry ids, so anything else is refetched
+            # the next time this student asks.
+            CourseworkIndexEntry(key.student_key, course_id).update(
+                actions=[CourseworkIndexEntry.stale.set(True)])
+
+
+def _remove_course_work(key, course_id, course_work_id):
+    from .tables import CourseworkIndexEntry
+    try:
+        entry = CourseworkIndexEntry.get(key, course_id)
+    except CourseworkIndexEntry.DoesNotExist:
+        return
+    entry.course_works = codec.dumps(
+        [cw for cw in codec.loads(entry.course_works) if cw['id'] != course_work_id])
+    entry.submissions = codec.dumps(
+        [s for s in codec.loads(entry.submissions) if s['courseWorkId'] != course_work_id])
+    entry.save()
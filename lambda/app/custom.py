@@ -2,24 +2,22 @@ from ask_sdk_core.dispatch_components import AbstractRequestHandler
 from ask_sdk.standard import StandardSkillBuilder
 from ask_sdk_core.utils import is_request_type
 from ask_sdk_core.handler_input import HandlerInput
-from ask_sdk_model import Response
-from googleapiclient.discovery import build
+from ask_sdk_model import RequestEnvelope, Response
 from google.oauth2.credentials import Credentials
-from pynamodb.models import Model
-from pynamodb.attributes import UnicodeAttribute, ListAttribute
 
-import datetime
-import uuid
+import functools
+import json
 import boto3
 
+from . import registrations
+from .log import get_logger, log_fields
+from .paging import iter_items
+from .service import get_service
+from .tables import UserMapping
 
-class UserMapping(Model):
-    class Meta:
-        table_name = "UserMapping"
-        region = "us-east-1"
-    google_user_id = UnicodeAttribute(hash_key=True)
-    alexa_user_id = UnicodeAttribute()
-    registration_ids = ListAttribute()
+logger = get_logger(__name__)
+
+NOTIFICATIONS_PERMISSION = "alexa::devices:all:notifications:write"
 
 
 class PermissionChangedEventHandler(AbstractRequestHandler):
@@ -38,59 +36,40 @@ class PermissionChangedEventHandler(AbstractRequestHandler):
 
         request = request_envelope.request
         permission_body = request.body
-        accepted_permissions = set(p.scope for p in permission_body.accepted_permissions)
-        if accepted_permissions:
-            print("Accepted permissions: {}".format(accepted_permissions))
-            user_attributes = attributes_manager.persistent_attributes
-            if "alexa::devices:all:notifications:write" in accepted_permissions:
-
-                print("Access token: {}".format(api_access_token))
-                creds = Credentials(api_access_token)
-                service = build('classroom', 'v1', credentials=creds)
-
-                user_profile = service.userProfiles().get(userId="me").execute()
-                google_user_id = user_profile['id']
-
-                courses = service.courses().list(studentId="me", fields="courses(id,name)").execute().get("courses", [])
-
-                registration_ids = []
-                batch_registration_request = service.new_batch_http_request()
-                for course in courses:
-                    print("Registering notifications for {}: {}".format(course['id'], course['name']))
-                    registration_id = str(uuid.uuid4())
-                    registration_ids.append(registration_id)
-                    batch_registration_request.add(service.registrations().create(body={
-                        "feed": {
-                            "feedType": "COURSE_WORK_CHANGES",
-                            "courseWorkChangesInfo": {
-                                "courseId": course['id']
-                            }
-                        },
-                        "cloudPubsubTopic": {
-                            "topicName": "projects/quickstart-1586973831483/topics/ClassroomNotifications"
-                        }
-                    }), callback=self._handle_registration_created)
-                batch_registration_request.execute()
-
-                new_user_mapping = UserMapping(google_user_id, alexa_user_id=alexa_user_id,\
-                    registration_ids=registration_ids)
-                new_user_mapping.save()
-                user_attributes["googleUserId"] = google_user_id
-                user_attributes["registrationIds"] = registration_ids
-            else:
-                registration_ids = user_attributes.get("registrationIds", [])
-                for registration_id in registration_ids:
-                    service.registrations().delete(registrationId=registration_id).execute()
-                user_attributes["registrationIds"] = []
-                user_attributes["googleUserId"] = None
-
+        accepted_permissions = set(p.scope for p in permission_body.accepted_permissions or [])
+        log_fields(logger, "Permissions changed", accepted=sorted(accepted_permissions))
+
+        user_attributes = attributes_manager.persistent_attributes
+        google_user_id = user_attributes.get("googleUserId")
+        current = user_attributes.get("registrations", {})
+        if api_access_token is None:
+            logger.warning("No linked account, registrations left unchanged")
+        elif NOTIFICATIONS_PERMISSION in accepted_permissions:
+            creds = Credentials(api_access_token)
+            service = get_service(creds)
+
+            user_profile = service.userProfiles().get(userId="me").execute()
+            google_user_id = user_profile['id']
+
+            courses = iter_items(service.courses(), service.courses().list(
+                studentId="me", fields="nextPageToken,courses(id)"), "courses")
+            current = registrations.sync(
+                service, [course['id'] for course in courses], current)
+        elif current:
+            creds = Credentials(api_access_token)
+            current = registrations.delete_all(get_service(creds), current)
+
+        registration_ids = [registrations.registration_id(r) for r in current.values()]
+        if google_user_id is not None:
+            UserMapping(google_user_id, alexa_user_id=alexa_user_id,
+                        registration_ids=registration_ids,
+                        registrations=json.dumps(current)).save()
+        linked = NOTIFICATIONS_PERMISSION in accepted_permissions or current
+        user_attributes["googleUserId"] = google_user_id if linked else None
+        user_attributes["registrations"] = current
+        user_attributes["registrationIds"] = registration_ids
         attributes_manager.save_persistent_attributes()
 
-    def _handle_registration_created(self, request_id, response, exception):
-        print("Registration error: {}".format(exception))
-        print("Registration error: {}".format(exception.error_details))
-        print("Registration created: {}".format(response))
-
 
 class ProactiveSubscriptionChanged(AbstractRequestHandler):
     def can_handle(self, handler_input):
@@ -108,10 +87,23 @@ class AccountLinkedEventHandler(AbstractRequestHandler):
         print("Account linked")
 
 
+@functools.lru_cache(maxsize=None)
 def get_handler():
+    # Built once per container. The table is provisioned with the stack, so
+    # no DescribeTable/CreateTable happens on the request path, and the
+    # skill (with its persistence adapter and boto3 resource) is reused by
+    # every invocation instead of being rebuilt per event.
     sb = StandardSkillBuilder(table_name="GoogleClassroomStates",\
-        auto_create_table=True)
+        dynamodb_client=boto3.resource("dynamodb"))
     sb.add_request_handler(PermissionChangedEventHandler())
     sb.add_request_handler(ProactiveSubscriptionChanged())
     sb.add_request_handler(AccountLinkedEventHandler())
-    return sb.lambda_handler()
+    skill = sb.create()
+
+    def lambda_handler(event, context):
+        request_envelope = skill.serializer.deserialize(
+            payload=json.dumps(event), obj_type=RequestEnvelope)
+        response_envelope = skill.invoke(
+            request_envelope=request_envelope, context=context)
+        return skill.serializer.serialize(response_envelope)
+    return lambda_handler
@@ -0,0 +1,89 @@
+import contextvars
+import os
+import time
+
+from . import completeness, tracing
+from .log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+# Alexa gives up on a skill after 8 seconds, long before the Lambda
+# timeout, so an invocation aims to answer within RESPONSE_TARGET_MS (or
+# the Lambda's remaining time, if that is shorter). RESPONSE_MARGIN_MS of
+# it is kept for building and returning the response.
+TARGET_MS = int(os.environ.get("RESPONSE_TARGET_MS", "6000"))
+MARGIN_MS = int(os.environ.get("RESPONSE_MARGIN_MS", "300"))
+
+# The Budget of the invocation running in this context. Each invocation,
+# and each concurrent one in the same process, sees only its own; worker
+# threads get it by running in a copy of the submitting context.
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class OutOfTime(Exception):
+    # Raised by a stage nothing can be answered without, such as finding
+    # out who the user is, when it runs out of time with nothing cached to
+    # fall back on. The invocation then answers with an empty response.
+    pass
+
+
+class Budget:
+    # One invocation's deadline, as a time.monotonic() value, and the
+    # stages that ran out of time. Work running on other threads holds on
+    # to the Budget it started with, so it still stops once the invocation
+    # that started it has returned. A stage that runs out of time is also
+    # marked incomplete in the completeness scope doing the work.
+    __slots__ = ("expires_at", "exhausted")
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+        self.exhausted = []
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def exhaust(self, stage):
+        if stage not in self.exhausted:
+            self.exhausted.append(stage)
+            tracing.count("deadline_exceeded")
+            log_fields(logger, "Deadline exceeded", stage=stage)
+        completeness.mark(stage)
+
+
+def begin(context):
+    # Returns the token finish() needs to restore the context as it was
+    budget_ms = TARGET_MS - MARGIN_MS
+    if context is not None:
+        budget_ms = min(budget_ms, context.get_remaining_time_in_millis() - MARGIN_MS)
+    return _current.set(Budget(time.monotonic() + budget_ms / 1000))
+
+
+def finish(token):
+    # Whatever runs next in this container, such as a custom skill event,
+    # is unbounded again
+    _current.reset(token)
+
+
+def current():
+    # None outside an invocation, which leaves everything unbounded
+    return _current.get()
+
+
+def expires_at():
+    budget = _current.get()
+    return budget.expires_at if budget is not None else None
+
+
+def remaining():
+    budget = _current.get()
+    return budget.remaining() if budget is not None else None
+
+
+def exhaust(stage):
+    budget = _current.get()
+    if budget is not None:
+        budget.exhaust(stage)
+
@@ -4,289 +4,144 @@
 # Please visit https://alexa.design/cookbook for additional examples on implementing slots, dialog management,
 # session persistence, api calls, and more.
 # This sample is built using the handler classes approach in skill builder.
-import uuid
-import logging
-import json
-import collections
-import dateutil.parser
-import datetime
 import functools
-from .google_classroom_handlers import handle_announcement, handle_course_works, handle_submission, handle_user_profile
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import hashlib
+import itertools
+import os
+from . import announcement_feed
+from . import grades
+from .log import begin_invocation, configure, get_logger, log_fields, log_payload
+from . import tracing
 from google.oauth2.credentials import Credentials
-from .custom import get_handler
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-STUDENT_PROFILE_NAMESPACE = "Alexa.Education.Profile.Student"
-COURSEWORK_NAMESPACE = "Alexa.Education.Coursework"
-ANNOUNCEMENTS_NAMESPACE = "Alexa.Education.School.Communication"
-COURSE_NAMESPACE = "Alexa.Education.Course"
-COURSE_WORK_GRADE_NAMESPACE = "Alexa.Education.Grade.Coursework"
+from .service import get_service
+from . import coursework_index
+from . import batch
+from . import classroom
+from . import completeness
+from . import deadline
+from .batch import run_concurrently, run_in_time
+from .cache import response_cache
+from .singleflight import flights
+from . import responses
+from .responses import (ANNOUNCEMENTS_NAMESPACE, COURSE_NAMESPACE, COURSE_WORK_GRADE_NAMESPACE,
+                        COURSEWORK_NAMESPACE, STUDENT_PROFILE_NAMESPACE)
+
+configure()
+logger = get_logger(__name__)
+
+# "async" runs the handlers on the asyncio engine in aio.py when aiohttp is
+# installed; anything else, or a missing aiohttp, keeps the handlers below.
+ENGINE = os.environ.get("EDUCATION_ENGINE", "sync")
 
 
 def student_profile_handler(request, creds, context):
-    service = build('classroom', 'v1', credentials=creds)
-    user_profile = service.userProfiles().get(userId="me").execute()
-    logger.info(json.dumps(user_profile))
-
-    return {
-        "response": {
-            "header": {
-                "namespace": STUDENT_PROFILE_NAMESPACE,
-                "name": "GetResponse",
-                "messageId": str(uuid.uuid4()),
-                "interfaceVersion": "1.0"
-            },
-            "payload": {
-                "paginationContext": {
-                    "totalCount": 1
-                },
-                "studentProfiles": [
-                    {
-                        "id": user_profile['id'],
-                        "accountRelationType": "SELF",
-                        "name": {
-                            "given": user_profile['name']['givenName'],
-                            "family": user_profile['name']['familyName'],
-                            "full": user_profile['name']['fullName']
-                        }
-                    }
-                ]
-            }
-        }
-    }
+    service = get_service(creds)
+    user_id = _current_user_id(service, creds)
+    with tracing.span("profiles"):
+        user_profile = response_cache.get(user_id, "profiles", user_id, functools.partial(
+            run_in_time, creds, "profiles",
+            functools.partial(_fetch_user_profile, service, user_id)))
+    user_profile = in_time(user_profile, "profiles", None, user_id, "profiles", user_id)
+    if user_profile is None:
+        raise deadline.OutOfTime("profiles")
+    return student_profile_response(user_profile)
 
 
 def course_handler(request, creds, context):
-    service = build('classroom', 'v1', credentials=creds)
+    service = get_service(creds)
     student_id = request['query']['matchAll']['studentId']
     max_results = request['paginationContext']['maxResults']
-    courses = service.courses().list(
-        studentId=student_id,
-        pageSize=max_results,
-        fields="courses(id,name,description)").execute()
-
-    course_list = courses.get("courses", [])
-    converted_courses = [
-        {
-            "id": c['id'],
-            "name": c['name'],
-            "description": c.get("description", "")
-        } for c in course_list
-    ]
-
-    return {
-        "response": {
-            "header": {
-                "namespace": COURSE_NAMESPACE,
-                "name": "GetResponse",
-                "interfaceVersion": "1.0",
-                "messageId": str(uuid.uuid4())
-            },
-            "payload": {
-                "paginationContext": {
-                    "totalCount": len(converted_courses)
-                },
-                "courses": converted_courses
-            }
-        }
-    }
+    user_id = _current_user_id(service, creds)
+    course_list = _cached_courses(service, creds, user_id, student_id)[:max_results]
+    return course_response(course_list)
 
 
 def coursework_handler(request, creds, context):
-    service = build('classroom', 'v1', credentials=creds)
+    service = get_service(creds)
     student_id = request['query']['matchAll']['studentId']
-    courses = service.courses().list(studentId=student_id,
-                                     fields="courses(id,name)").execute()
-    logger.info("Courses: {}".format(json.dumps(courses)))
+    user_id = _current_user_id(service, creds)
+    all_courses = _list_courses(service, creds, user_id, student_id)
+    log_payload(logger, "Courses", all_courses)
 
     due_time = request['query']['matchAll']['dueTime']
-    due_start_str, due_end_str = due_time['start'], due_time['end']
-    due_start = dateutil.parser.isoparse(due_start_str)
-    due_end = dateutil.parser.isoparse(due_end_str)
+    start_key, end_key = classroom.due_window(due_time)
 
     pagination_context = request['paginationContext']
     max_results = pagination_context['maxResults']
 
-    all_course_works, num_course_works = {}, 0
-    all_submissions = collections.defaultdict(list)
-
-    course_ids = [c['id'] for c in courses.get("courses", [])]
-
-    handle_course_works_partial = functools.partial(
-        handle_course_works, all_course_works=all_course_works)
-    handle_submissions_partial = functools.partial(
-        handle_submission, all_submissions=all_submissions)
-    batch_cw_request = service.new_batch_http_request()
-    batch_submissions_request = service.new_batch_http_request()
-
-    for course in courses.get("courses", []):
-        course_id, course_name = course['id'], course['name']
-        batch_cw_request.add(service.courses().courseWork().list(
-            courseId=course_id, orderBy="dueDate desc", pageSize=max_results,
-            fields="courseWork(id,workType,courseId,dueDate,dueTime,title,description,creationTime)"),
-            callback=functools.partial(handle_course_works,
-                                       all_course_works=all_course_works))
-        submission_request = service.courses().courseWork().studentSubmissions().list(
-            courseId=course_id,
-            courseWorkId="-",
-            userId=student_id
-        )
-        batch_submissions_request.add(
-            submission_request, callback=handle_submissions_partial)
-    batch_cw_request.execute()
-    batch_submissions_request.execute()
-
-    converted_course_works = []
-    for course_work in all_course_works.values():
-        if course_work.get("workType", "") != "ASSIGNMENT" or "dueDate" not in course_work:
-            continue
-
-        course_work_id = course_work['id']
-        course_id = course_work['courseId']
-        cw_due_date_obj = course_work['dueDate']
-        cw_due_time_obj = course_work['dueTime']
-        cw_due_date = datetime.datetime(
-            year=cw_due_date_obj['year'],
-            month=cw_due_date_obj['month'],
-            day=cw_due_date_obj['day'],
-            hour=cw_due_time_obj['hours'],
-            minute=cw_due_time_obj['minutes'],
-            tzinfo=datetime.timezone.utc)
-
-        # Apparently there is a difference between how Alexa counts as
-        # "today" and how google counts as "today"
-        if cw_due_date < due_start or cw_due_date > due_end:
-            continue
-
-        converted_cw = {
-            "id": course_work_id,
-            "courseId": course_id,
-            "courseName": course_name,
-            "title": course_work['title'],
-            "description": course_work.get('description', ""),
-            "type": "ASSIGNMENT",
-            "submissionState": "MISSING",
-            "dueTime": cw_due_date.isoformat(),
-            "publishedTime": course_work['creationTime']
-        }
-        logger.info("Converted course work: {}".format(converted_cw))
-
-        submissions = all_submissions.get(course_work_id, [])
-        converted_cw["submissionState"] = "NOT_SUBMITTED" if len(
-            submissions) <= 0 else "SUBMITTED"
-        converted_course_works.append(converted_cw)
-
-    return {
-        "response": {
-            "header": {
-                "namespace": COURSEWORK_NAMESPACE,
-                "name": "GetResponse",
-                "interfaceVersion": "1.0",
-                "messageId": str(uuid.uuid4())
-            },
-            "payload": {
-                "paginationContext": {
-                    "totalCount": len(converted_course_works)
-                },
-                "coursework": converted_course_works
-            }
-        }
-    }
+    if coursework_index.enabled():
+        all_course_works, all_submissions = coursework_index.course_data(
+            coursework_index.student_key(user_id, student_id), list(all_courses),
+            functools.partial(classroom.fetch_course_data, service, creds, student_id))
+        due_course_works = classroom.earliest_due(
+            all_course_works.values(), start_key, end_key, max_results)
+    else:
+        # The course set is part of the key, so a course list that changed
+        # since the coursework was cached does not pick up the old entry
+        cache_key = [student_id, due_time['start'], due_time['end'], max_results,
+                     sorted(all_courses)]
+        submissions_key = [student_id, "submitted", sorted(all_courses)]
+        # Devices in one household tend to ask the same thing at once
+        due_course_works, all_submissions = flights.do(
+            [user_id, COURSEWORK_NAMESPACE] + cache_key,
+            run_concurrently, creds,
+            functools.partial(response_cache.get, user_id, "course_works", cache_key,
+                              functools.partial(classroom.fetch_due_course_works, service,
+                                                all_courses, start_key, end_key, max_results)),
+            functools.partial(response_cache.get, user_id, "submissions", submissions_key,
+                              functools.partial(classroom.fetch_submissions, service,
+                                                all_courses, student_id,
+                                                classroom.SUBMISSION_STATE_FIELDS,
+                                                classroom.SUBMITTED_STATES)))
+        due_course_works = in_time(
+            due_course_works, "courseWork", [], user_id, "course_works", cache_key)
+        all_submissions, submissions_known = in_time_complete(
+            all_submissions, "studentSubmissions", {}, user_id, "submissions", submissions_key)
+        return coursework_response(due_course_works, all_submissions, all_courses,
+                                   submissions_known)
+    return coursework_response(due_course_works, all_submissions, all_courses,
+                               not completeness.incomplete("studentSubmissions"))
 
 
 def coursework_grade_handler(request, creds, context):
-    service = build('classroom', 'v1', credentials=creds)
+    service = get_service(creds)
     max_results = request['paginationContext']['maxResults']
 
     query = request['query']['matchAll']
     student_id = query['studentId']
-    all_courses = {}
+    user_id = _current_user_id(service, creds)
     if 'courseId' in query:
-        course = service.courses().get(
-            id=query['courseId'], fields="id,name").execute()
-        all_courses[course["id"]] = course["name"]
+        with tracing.span("courses"):
+            course = run_in_time(creds, "courses", functools.partial(
+                _fetch_course, service, query['courseId']))
+        # Without the course in time there is nothing to grade
+        all_courses = {course["id"]: course["name"]} if course is not None else {}
     else:
-        response = service.courses().list(
-            studentId=student_id, fields="courses(id,name)").execute()
-        courses = response.get("courses", [])
-        all_courses.update({c['id']: c['name'] for c in courses})
-
-    all_submissions = collections.defaultdict(list)
-    all_course_works = {}
-    handle_submissions_partial = functools.partial(
-        handle_submission, all_submissions=all_submissions)
-
-    batch_submissions_request = service.new_batch_http_request()
-    batch_cw_request = service.new_batch_http_request()
-    for course_id in all_courses.keys():
-        batch_submissions_request.add(service.courses().courseWork().studentSubmissions().list(
-            courseId=course_id, courseWorkId="-"), callback=handle_submissions_partial)
-        batch_cw_request.add(service.courses().courseWork().list(
-            courseId=course_id, orderBy="dueDate desc",
-            fields="courseWork(id,title,maxPoints)"),
-            callback=functools.partial(handle_course_works,
-                                       all_course_works=all_course_works))
-    batch_submissions_request.execute()
-    batch_cw_request.execute()
-
-    all_grades = []
-    for student_submissions in all_submissions.values():
-        graded_submissions = list(filter(lambda s: s.get(
-            "assignedGrade") is not None, student_submissions))
-        if len(graded_submissions) > 0:
-            last_submission = graded_submissions[-1]
-            course_work_id = last_submission['courseWorkId']
-            course_id = last_submission['courseId']
-
-            course_work = all_course_works.get(course_work_id)
-            course_name = all_courses.get(course_id)
-            if course_work is None or course_name is None or course_work.get("title") is None\
-                    or course_work.get("maxPoints") is None or course_work.get("maxPoints") == 0:
-                continue
+        all_courses = _list_courses(service, creds, user_id, student_id)
 
-            course_work_title = course_work["title"]
-
-            current_grade = {
-                "courseworkId": course_work_id,
-                "courseId": course_id,
-                "courseName": course_name,
-                "studentId": student_id,
-                "courseworkType": "ASSIGNMENT",
-                "courseworkTitle": course_work_title,
-                "grade": {
-                    "overallGrade": {
-                        "gradeScore": {
-                            "type": "POINTS",
-                            "score": last_submission["assignedGrade"],
-                            "maxPoints": course_work['maxPoints']
-                        }
-                    }
-                },
-                "lastGradedTime": last_submission["updateTime"]
-            }
-            all_grades.append(current_grade)
-
-    return {
-        "response": {
-            "header": {
-                "namespace": COURSE_WORK_GRADE_NAMESPACE,
-                "name": "GetResponse",
-                "interfaceVersion": "1.0",
-                "messageId": str(uuid.uuid4())
-            },
-            "payload": {
-                "paginationContext": {
-                    "totalCount": len(all_grades)
-                },
-                "courseworkGrades": all_grades
-            }
-        }
-    }
+    if coursework_index.enabled():
+        all_course_works, all_submissions = coursework_index.course_data(
+            coursework_index.student_key(user_id, student_id), list(all_courses),
+            functools.partial(classroom.fetch_course_data, service, creds, student_id))
+    else:
+        submissions_key = [student_id, "graded", sorted(all_courses)]
+        all_course_works, all_submissions = flights.do(
+            [user_id, COURSE_WORK_GRADE_NAMESPACE, student_id, sorted(all_courses)],
+            run_concurrently, creds,
+            functools.partial(response_cache.get, user_id, "course_works", sorted(all_courses),
+                              functools.partial(classroom.fetch_course_works, service,
+                                                all_courses, classroom.GRADE_COURSE_WORK_FIELDS)),
+            functools.partial(response_cache.get, user_id, "submissions", submissions_key,
+                              functools.partial(classroom.fetch_submissions, service,
+                                                all_courses, student_id,
+                                                classroom.GRADED_SUBMISSION_FIELDS,
+                                                classroom.GRADED_STATES)))
+        all_course_works = in_time(all_course_works, "courseWork", {}, user_id, "course_works",
+                                    sorted(all_courses))
+        all_submissions = in_time(all_submissions, "studentSubmissions", {}, user_id,
+                                  "submissions", submissions_key)
+    return grade_response(all_course_works, all_submissions, all_courses, student_id,
+                           max_results)
 
 
 def announcements_handler(request, creds, context):
@@ -295,63 +150,177 @@ def announcements_handler(request, creds, context):
     query = request['query']
     student_id = query['matchAll'].get('studentId', "me")
 
-    service = build('classroom', 'v1', credentials=creds)
-    courses = service.courses().list(studentId=student_id,
-                                     fields="courses(id)").execute()
-
-    all_announcements = []
-    announcements_partial = functools.partial(
-        handle_announcement, all_announcements=all_announcements)
-    course_ids = [c['id'] for c in courses.get("courses", [])]
-    batch_request = service.new_batch_http_request()
-    for course_id in course_ids:
-        batch_request.add(service.courses().announcements().list(
-            courseId=course_id), callback=announcements_partial)
-    batch_request.execute()
-    logger.info("Announcements: {}".format(json.dumps(all_announcements)))
-
-    all_users = {}
-    user_profiles_partial = functools.partial(
-        handle_user_profile, all_users=all_users)
+    service = get_service(creds)
+    user_id = _current_user_id(service, creds)
+    all_courses = _list_courses(service, creds, user_id, student_id)
+
+    all_announcements, all_users = flights.do(
+        [user_id, ANNOUNCEMENTS_NAMESPACE, student_id, max_results],
+        _fetch_announcements, service, user_id, list(all_courses), max_results)
+    return announcements_response(all_announcements, all_users)
+
+
+# The response builders are shared by the synchronous handlers above and
+# the asyncio engine in aio.py, so both answer with the same payloads.
+def student_profile_response(user_profile):
+    log_payload(logger, "User profile", user_profile)
+    name = user_profile['name']
+    return responses.build(STUDENT_PROFILE_NAMESPACE, [responses.StudentProfile(
+        user_profile['id'], name['givenName'], name['familyName'], name['fullName'])])
+
+
+def course_response(course_list):
+    return responses.build(COURSE_NAMESPACE, [
+        responses.Course(c['id'], c['name'], c.get("description", "")) for c in course_list])
+
+
+def coursework_response(due_course_works, all_submissions, all_courses, submissions_known=True):
+    # Without all the submissions, only coursework found submitted has a
+    # known state; the rest is left out rather than called NOT_SUBMITTED
+    with tracing.span("convert"):
+        records = []
+        for course_work in due_course_works:
+            course_work_id = course_work['id']
+            course_id = course_work['courseId']
+            if course_id not in all_courses:
+                # From a course the student has since left
+                continue
+            # The index keeps submissions in every state, so the state is
+            # checked here too
+            submitted = any(s.get('state') in classroom.SUBMITTED_STATES
+                            for s in all_submissions.get(course_work_id, []))
+            if not (submitted or submissions_known):
+                continue
+            records.append(responses.Coursework(
+                course_work_id, course_id, all_courses[course_id], course_work['title'],
+                course_work.get('description', ""),
+                "SUBMITTED" if submitted else "NOT_SUBMITTED",
+                _due_time(course_work), course_work['creationTime']))
+        response = responses.build(COURSEWORK_NAMESPACE, records)
+    log_fields(logger, "Coursework converted", courses=len(all_courses),
+               coursework=len(records))
+    log_payload(logger, "Converted course works", response['response']['payload']['coursework'])
+    return response
+
+
+def grade_response(all_course_works, all_submissions, all_courses, student_id, max_results):
+    with tracing.span("convert"):
+        latest_grades = grades.latest_grades(
+            itertools.chain.from_iterable(all_submissions.values()))
+        return responses.build(COURSE_WORK_GRADE_NAMESPACE, grades.top_grades(
+            latest_grades, all_course_works, all_courses, max_results, student_id))
+
+
+def announcements_response(all_announcements, all_users):
+    with tracing.span("convert"):
+        response = responses.build(ANNOUNCEMENTS_NAMESPACE, [
+            responses.Announcement(a['id'], _extract_name(all_users.get(a['creatorUserId'])),
+                                   a['text'], a['updateTime'])
+            for a in all_announcements])
+    log_payload(logger, "Converted announcements",
+                response['response']['payload']['schoolCommunications'])
+    return response
+
+
+# The user, profile and course lookups come before the fetch stages and
+# are bounded by the deadline as well, falling back on what was cached
+# last, however old.
+@tracing.traced("user")
+def _current_user_id(service, creds):
+    # Cache entries are scoped to the Google user behind the token, which
+    # is itself remembered per token so it is only looked up once.
+    token_hash = hashlib.sha256(creds.token.encode("utf-8")).hexdigest()
+    user_id = response_cache.get(token_hash, "user_id", "me", functools.partial(
+        run_in_time, creds, "user", functools.partial(
+            flights.do, [token_hash, "user_id"], _fetch_current_user_id, service)))
+    user_id = in_time(user_id, "user", None, token_hash, "user_id", "me")
+    if user_id is None:
+        raise deadline.OutOfTime("user")
+    return user_id
+
+
+def _fetch_current_user_id(service, http=None):
+    user_profile = service.userProfiles().get(userId="me").execute(http=http)
+    tracing.count("api_calls")
+    response_cache.put(user_profile['id'], "profiles", user_profile['id'], user_profile)
+    return user_profile['id']
+
+
+def _fetch_user_profile(service, user_id, http=None):
+    tracing.count("api_calls")
+    return service.userProfiles().get(userId=user_id).execute(http=http)
+
+
+def _fetch_course(service, course_id, http=None):
+    tracing.count("api_calls")
+    return service.courses().get(id=course_id, fields="id,name").execute(http=http)
+
+
+@tracing.traced("courses")
+def _cached_courses(service, creds, user_id, student_id):
+    courses = response_cache.get(user_id, "courses", student_id, functools.partial(
+        run_in_time, creds, "courses", functools.partial(
+            flights.do, [user_id, "courses", student_id], classroom.fetch_courses, service,
+            student_id)))
+    return in_time(courses, "courses", [], user_id, "courses", student_id)
+
+
+def _list_courses(service, creds, user_id, student_id):
+    return {c['id']: c['name'] for c in _cached_courses(service, creds, user_id, student_id)}
+
+
+def _fetch_announcements(service, user_id, course_ids, max_results):
+    # The newest announcements across the courses and their creators'
+    # profiles
+    with tracing.span("announcements"):
+        all_announcements = announcement_feed.recent(service, user_id, course_ids, max_results)
+    log_payload(logger, "Announcements", all_announcements)
+
     user_ids = set([a['creatorUserId'] for a in all_announcements])
-    user_batch_requests = service.new_batch_http_request()
-    for user_id in user_ids:
-        user_batch_requests.add(service.userProfiles().get(
-            userId=user_id, fields="id,name"), callback=user_profiles_partial)
-    user_batch_requests.execute()
-
-    converted_announcements = [
-        {
-            "id": a['id'],
-            'type': 'GENERIC_FROM',
-            'kind': 'ANNOUNCEMENT',
-            'from': _extract_name(all_users.get(a['creatorUserId'])),
-            'content': {
-                'type': 'PLAIN_TEXT',
-                'text': a['text']
-            },
-            'publishedTime': a['updateTime']
-        } for a in all_announcements[:max_results]
-    ]
-    logger.info("Converted announcements: {}".format(
-        json.dumps(converted_announcements)))
-
-    return {
-        "response": {
-            "header": {
-                "namespace": ANNOUNCEMENTS_NAMESPACE,
-                "name": "GetResponse",
-                "interfaceVersion": "1.0",
-                "messageId": str(uuid.uuid4())
-            },
-            "payload": {
-                "paginationContext": {
-                    "totalCount": len(converted_announcements)
-                },
-                "schoolCommunications": converted_announcements
-            }
-        }
-    }
+    with tracing.span("profiles"):
+        all_users = response_cache.get_many(user_id, "profiles", user_ids)
+        # A creator whose profile cannot be fetched is announced without a name
+        fetched_users = batch.execute(service, {
+            creator_id: service.userProfiles().get(userId=creator_id,
+                                                    fields=classroom.PROFILE_NAME_FIELDS)
+            for creator_id in user_ids.difference(all_users)
+        }).responses
+        for creator_id, user_profile in fetched_users.items():
+            response_cache.put(user_id, "profiles", creator_id, user_profile)
+        all_users.update(fetched_users)
+    return all_announcements, all_users
+
+
+def in_time(value, stage, default, user_id=None, resource=None, key=None):
+    # What a fetch returned, unless it ran out of time: then the last
+    # cached answer, stale or not, or an empty one. A fetch that is still
+    # running (None) marks the stage exhausted, and one that stopped early
+    # has already marked it incomplete. The asyncio engine answers the
+    # same way.
+    return in_time_complete(value, stage, default, user_id, resource, key)[0]
+
+
+def in_time_complete(value, stage, default, user_id=None, resource=None, key=None):
+    # in_time's answer, and whether it is whole: only complete fetches are
+    # cached, so a stale answer is, while what was found before the
+    # deadline is not
+    if value is None:
+        deadline.exhaust(stage)
+    elif not completeness.incomplete(stage):
+        return value, True
+    if resource is not None:
+        cached = response_cache.stale(user_id, resource, key)
+        if cached is not None:
+            return cached, True
+    return (value if value is not None else default), False
+
+
+def _due_time(course_work):
+    due_date = course_work['dueDate']
+    due_time = course_work.get('dueTime', {})
+    return "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:00+00:00".format(
+        due_date['year'], due_date['month'], due_date['day'],
+        due_time.get('hours', 0), due_time.get('minutes', 0))
 
 
 def _extract_name(user):
@@ -370,19 +339,44 @@ HANDLER_MAP = {
 }
 
 
+def _engine_handler(namespace):
+    if ENGINE == "async":
+        from . import aio
+        if aio.available():
+            return functools.partial(aio.run, namespace)
+        logger.warning("EDUCATION_ENGINE=async but aiohttp is not installed")
+    return HANDLER_MAP[namespace]
+
+
 def handler(event, context):
-    logger.info(json.dumps(event))
+    begin_invocation()
     request = event['request']
 
     if 'header' in request:
         header = request['header']
         namespace, name = header['namespace'], header['name']
+        log_fields(logger, "Education request", namespace=namespace, name=name)
+        log_payload(logger, "Education request payload", request.get('payload'))
 
         authorization = request['authorization']
         creds = Credentials(authorization['token'])
 
-        real_handler = HANDLER_MAP[namespace]
-        return real_handler(request['payload'], creds, context)
+        real_handler = _engine_handler(namespace)
+        tracing.begin(namespace)
+        deadline_token = deadline.begin(context)
+        try:
+            with completeness.scope():
+                return real_handler(request['payload'], creds, context)
+        except deadline.OutOfTime:
+            return responses.build(namespace, [])
+        finally:
+            deadline.finish(deadline_token)
+            tracing.finish()
     else:
+        # The custom skill stack (ask_sdk, boto3, pynamodb) is only needed
+        # for skill events, so education requests never pay for importing it.
+        from .custom import get_handler
+        log_fields(logger, "Skill event", type=request.get('type'))
+        log_payload(logger, "Skill event request", request)
         custom_handler = get_handler()
         return custom_handler(event, context)
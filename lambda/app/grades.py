@@ -0,0 +1,42 @@
+import heapq
+import operator
+
+from .responses import CourseworkGrade
+from .timeutil import timestamp_key
+
+
+def latest_grades(submissions):
+    # One pass over every submission, keeping the most recently updated
+    # graded one per (courseId, courseWorkId). The index refers to the
+    # submissions themselves rather than copying them.
+    latest = {}
+    for submission in submissions:
+        if submission.get("assignedGrade") is None:
+            continue
+        key = submission["courseId"], submission["courseWorkId"]
+        current = latest.get(key)
+        if current is None or \
+                timestamp_key(submission["updateTime"]) > timestamp_key(current["updateTime"]):
+            latest[key] = submission
+    return latest
+
+
+def top_grades(latest, course_works, course_names, max_results, student_id=None):
+    # Joins the latest grades with their coursework (by id) and course name,
+    # dropping ungradable coursework, and returns up to max_results
+    # CourseworkGrade records for the student, most recently graded first.
+    # Only the returned rows are ever turned into records.
+    def joined():
+        for (course_id, course_work_id), submission in latest.items():
+            course_work = course_works.get(course_work_id)
+            course_name = course_names.get(course_id)
+            if course_work is None or course_name is None or course_work.get("title") is None\
+                    or not course_work.get("maxPoints"):
+                continue
+            yield timestamp_key(submission["updateTime"]), submission, course_work, course_name
+
+    rows = heapq.nlargest(max_results, joined(), key=operator.itemgetter(0))
+    return [CourseworkGrade(submission["courseId"], course_name, submission["courseWorkId"],
+                            course_work["title"], submission["assignedGrade"],
+                            course_work["maxPoints"], submission["updateTime"], student_id)
+            for _, submission, course_work, course_name in rows]
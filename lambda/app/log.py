@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import random
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Payload dumps are DEBUG records, so they are dropped before anything is
+# serialized unless LOG_LEVEL=DEBUG. Even then only this fraction of
+# invocations logs them, each capped at PAYLOAD_LOG_MAX_BYTES.
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get("PAYLOAD_LOG_SAMPLE_RATE", "1.0"))
+PAYLOAD_LOG_MAX_BYTES = int(os.environ.get("PAYLOAD_LOG_MAX_BYTES", "4096"))
+
+_payloads_sampled = True
+
+
+class Payload:
+    __slots__ = ("value", "max_bytes")
+
+    def __init__(self, value, max_bytes=PAYLOAD_LOG_MAX_BYTES):
+        self.value = value
+        self.max_bytes = max_bytes
+
+    def __str__(self):
+        text = json.dumps(self.value, default=str, separators=(",", ":"))
+        if len(text) > self.max_bytes:
+            return "{}...<{} more bytes>".format(text[:self.max_bytes], len(text) - self.max_bytes)
+        return text
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        # Set by the Lambda runtime's own log filter
+        request_id = getattr(record, "aws_request_id", None)
+        if request_id:
+            entry["requestId"] = request_id
+        entry.update(getattr(record, "fields", {}))
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            entry["payload"] = str(payload)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+def configure():
+    root = logging.getLogger()
+    if not root.handlers:
+        root.addHandler(logging.StreamHandler())
+    for handler in root.handlers:
+        handler.setFormatter(StructuredFormatter())
+
+
+def get_logger(name):
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    return logger
+
+
+def begin_invocation():
+    # Sampling is decided per invocation so a sampled request logs all of
+    # its payloads and the others log none.
+    global _payloads_sampled
+    _payloads_sampled = random.random() < PAYLOAD_LOG_SAMPLE_RATE
+
+
+def log_fields(logger, message, level=logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def log_payload(logger, message, value, **fields):
+    if _payloads_sampled and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, extra={"fields": fields, "payload": Payload(value)})
@@ -0,0 +1,117 @@
+import base64
+import hmac
+import json
+import logging
+import os
+import sys
+
+import cachetools
+
+from . import coursework_index
+from .log import configure, get_logger, log_fields, log_payload
+
+configure()
+logger = get_logger(__name__)
+
+# The push endpoint is public, so a push is only processed once it proves
+# it comes from our subscription, either with
+# - the OIDC token Pub/Sub signs for PUBSUB_PUSH_SERVICE_ACCOUNT, with
+#   PUBSUB_PUSH_AUDIENCE as its audience, in the Authorization header, or
+# - the PUBSUB_PUSH_TOKEN secret in the endpoint's `token` parameter.
+# With neither configured every push is refused.
+PUSH_AUDIENCE = os.environ.get("PUBSUB_PUSH_AUDIENCE")
+PUSH_SERVICE_ACCOUNT = os.environ.get("PUBSUB_PUSH_SERVICE_ACCOUNT")
+PUSH_TOKEN = os.environ.get("PUBSUB_PUSH_TOKEN")
+GOOGLE_CERTS_URL = os.environ.get("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Google publishes its signing certificates well before using them, so
+# they are fetched once an hour rather than per push
+_certs = cachetools.TTLCache(1, 60 * 60)
+
+
+def process_message(data, attributes):
+    notification = json.loads(data)
+    log_fields(logger, "Classroom notification",
+               registration_id=attributes.get("registrationId"),
+               collection=notification.get("collection"),
+               event_type=notification.get("eventType"))
+    log_payload(logger, "Classroom notification payload", notification)
+    coursework_index.apply_change(notification)
+
+
+def _google_certs():
+    certs = _certs.get(GOOGLE_CERTS_URL)
+    if certs is None:
+        import httplib2
+        from google.auth import exceptions
+        from google_auth_httplib2 import Request
+
+        response = Request(httplib2.Http(timeout=10))(GOOGLE_CERTS_URL, method="GET")
+        if response.status != 200:
+            raise exceptions.TransportError(
+                "Could not fetch certificates at {}".format(GOOGLE_CERTS_URL))
+        certs = _certs[GOOGLE_CERTS_URL] = json.loads(response.data.decode("utf-8"))
+    return certs
+
+
+def _verify_oidc_token(token):
+    from google.auth import jwt
+
+    if not (PUSH_AUDIENCE and PUSH_SERVICE_ACCOUNT):
+        return False
+    try:
+        claims = jwt.decode(token, certs=_google_certs(), audience=PUSH_AUDIENCE)
+    except ValueError as e:
+        log_fields(logger, "Push token rejected", error=str(e))
+        return False
+    # Any Google account can get a token for any audience, so it is the
+    # signer that counts
+    return claims.get("iss") in GOOGLE_ISSUERS and claims.get("email_verified") is True \
+        and claims.get("email") == PUSH_SERVICE_ACCOUNT
+
+
+def authenticate(event):
+    # Returns None for a push from our subscription, or else the status to
+    # refuse it with: 401 without credentials, 403 with wrong ones
+    token = (event.get('queryStringParameters') or {}).get('token')
+    authorization = next((value for name, value in (event.get('headers') or {}).items()
+                          if name.lower() == "authorization"), "")
+    if token is not None:
+        return None if PUSH_TOKEN and hmac.compare_digest(
+            token.encode("utf-8"), PUSH_TOKEN.encode("utf-8")) else 403
+    if authorization.startswith("Bearer "):
+        return None if _verify_oidc_token(authorization[len("Bearer "):]) else 403
+    return 401
+
+
+def handler(event, context):
+    # Pub/Sub push subscription delivered through API Gateway
+    status = authenticate(event)
+    if status is not None:
+        log_fields(logger, "Push refused", logging.WARNING, status=status)
+        return {"statusCode": status}
+    body = json.loads(event['body'])
+    message = body['message']
+    process_message(base64.b64decode(message.get('data', "")), message.get('attributes', {}))
+    return {"statusCode": 204}
+
+
+def pull(subscription, max_messages=100):
+    # Honours PUBSUB_EMULATOR_HOST, so it can be run against the local
+    # emulator as well as the real subscription.
+    from google.cloud import pubsub_v1
+
+    subscriber = pubsub_v1.SubscriberClient()
+    response = subscriber.pull(subscription, max_messages, return_immediately=True)
+    ack_ids = []
+    for received_message in response.received_messages:
+        message = received_message.message
+        process_message(message.data, message.attributes)
+        ack_ids.append(received_message.ack_id)
+    if ack_ids:
+        subscriber.acknowledge(subscription, ack_ids)
+    return len(ack_ids)
+
+
+if __name__ == '__main__':
+    print("Processed {} notifications".format(pull(sys.argv[1])))
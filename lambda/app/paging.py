@@ -0,0 +1,88 @@
+import itertools
+
+from . import batch, completeness, deadline
+from .tracing import count, span
+
+
+def iter_pages(collection, request, http=None):
+    while request is not None:
+        with span("page"):
+            response = request.execute(http=http)
+        count("api_calls")
+        yield response
+        request = collection.list_next(request, response)
+
+
+def iter_items(collection, request, items_key, until=None, http=None):
+    # Like iter_batched, sends no further page once the invocation's
+    # deadline has passed, and marks the stage out of time by its items_key
+    budget = deadline.current()
+    while request is not None:
+        if budget is not None and budget.expired():
+            budget.exhaust(items_key)
+            return
+        with span("page"):
+            response = request.execute(http=http)
+        count("api_calls")
+        count("items", len(response.get(items_key, [])))
+        for item in response.get(items_key, []):
+            if until is not None and until(item):
+                return
+            yield item
+        request = collection.list_next(request, response)
+
+
+def iter_batched(service, requests, items_key, until=None, http=None):
+    # `requests` is an iterable of (key, list_next, request), where
+    # list_next(request, response) builds the next page's request, usually
+    # the collection's own list_next. Every round sends the next page of
+    # each source that still has one through batch.execute, which chunks
+    # and retries them, and yields (key, item) pairs. A source stops paging
+    # once `until` matches one of its items; the caller stops everything by
+    # simply not asking for more. Once the invocation's deadline has passed
+    # no further round is sent. That, or a source whose page still fails
+    # after the retries, marks the stage incomplete by its items_key, so
+    # what was read is not cached as if it were everything.
+    budget = deadline.current()
+    pending = list(requests)
+    while pending:
+        if budget is not None and budget.expired():
+            budget.exhaust(items_key)
+            return
+        responses = batch.execute(service, {
+            index: request for index, (key, list_next, request) in enumerate(pending)
+        }, deadline=budget.expires_at if budget is not None else None, http=http).responses
+
+        next_pending = []
+        for index, (key, list_next, request) in enumerate(pending):
+            # A source whose page still failed after the retries ends here
+            response = responses.get(index)
+            if response is None:
+                completeness.mark(items_key)
+                continue
+            count("items", len(response.get(items_key, [])))
+            for item in response.get(items_key, []):
+                if until is not None and until(item):
+                    break
+                yield key, item
+            else:
+                next_request = list_next(request, response)
+                if next_request is not None:
+                    next_pending.append((key, list_next, next_request))
+        pending = next_pending
+
+
+def token_pager(list_method, **kwargs):
+    # Builds next-page requests by calling `list_method` again with the
+    # page token. Needed for requests with a repeated query parameter such
+    # as `states`, which the collection's list_next refuses to rewrite.
+    def list_next(request, response):
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return None
+        return list_method(pageToken=page_token, **kwargs)
+    return list_next
+
+
+def take(iterable, max_results):
+    return list(itertools.islice(iterable, max_results))
@@ -0,0 +1,102 @@
+import datetime
+import functools
+import os
+
+from . import batch, timeutil
+from .log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+TOPIC_NAME = os.environ.get(
+    "CLASSROOM_NOTIFICATIONS_TOPIC",
+    "projects/quickstart-1586973831483/topics/ClassroomNotifications")
+# Classroom expires registrations after about a week. One that expires
+# within REGISTRATION_RENEW_SECONDS is replaced at the next sync.
+RENEW_SECONDS = int(os.environ.get("REGISTRATION_RENEW_SECONDS", 24 * 60 * 60))
+
+
+def sync(service, course_ids, existing):
+    # `existing` maps course ids to the registrations stored for them, as
+    # {"registrationId", "expiryTime"}. Courses without a registration, or
+    # whose registration has expired or is about to, are registered (the
+    # old registration is then deleted), and registrations of courses the
+    # user left are deleted. Returns the new mapping; requests that failed
+    # leave their course as it was, so the next sync retries them.
+    wanted = set(course_ids)
+    renew_key = timeutil.datetime_key(
+        datetime.datetime.now(timeutil.UTC) + datetime.timedelta(seconds=RENEW_SECONDS))
+    missing = [course_id for course_id in wanted
+               if course_id not in existing or _expiry_key(existing[course_id]) <= renew_key]
+    created = execute(service, {
+        course_id: functools.partial(_create_request, service, course_id)
+        for course_id in missing
+    })
+    stale = {course_id: registration for course_id, registration in existing.items()
+             if course_id not in wanted or course_id in created}
+    deleted = execute(service, {
+        course_id: functools.partial(_delete_request, service, registration_id(registration))
+        for course_id, registration in stale.items()
+    }, missing_ok=True)
+
+    registrations = {course_id: registration for course_id, registration in existing.items()
+                     if course_id not in deleted}
+    registrations.update(
+        (course_id, {"registrationId": response['registrationId'],
+                     "expiryTime": response.get('expiryTime')})
+        for course_id, response in created.items())
+    log_fields(logger, "Registrations synced", courses=len(wanted), created=len(created),
+               renewed=len(set(created).intersection(existing)), deleted=len(deleted),
+               failed=len(missing) - len(created) + len(stale) - len(deleted))
+    return registrations
+
+
+def delete_all(service, registrations):
+    # Returns the registrations that could not be deleted
+    deleted = execute(service, {
+        course_id: functools.partial(_delete_request, service, registration_id(registration))
+        for course_id, registration in registrations.items()
+    }, missing_ok=True)
+    log_fields(logger, "Registrations deleted", deleted=len(deleted),
+               failed=len(registrations) - len(deleted))
+    return {course_id: registration for course_id, registration in registrations.items()
+            if course_id not in deleted}
+
+
+def registration_id(registration):
+    # Registrations were once stored as bare ids
+    return registration if isinstance(registration, str) else registration['registrationId']
+
+
+def _expiry_key(registration):
+    # A bare id has no known expiry, so it is renewed
+    expiry_time = None if isinstance(registration, str) else registration.get('expiryTime')
+    return timeutil.timestamp_key(expiry_time) if expiry_time else ""
+
+
+def execute(service, requests, missing_ok=False):
+    # `requests` maps keys to factories building one API request each.
+    # Returns {key: response} for the ones that succeeded; the failures are
+    # logged.
+    result = batch.execute(service, {key: factory() for key, factory in requests.items()},
+                           missing_ok=missing_ok)
+    for key, exception in result.failures.items():
+        log_fields(logger, "Registration request failed", key=key, error=str(exception))
+    return result.responses
+
+
+def _create_request(service, course_id):
+    return service.registrations().create(body={
+        "feed": {
+            "feedType": "COURSE_WORK_CHANGES",
+            "courseWorkChangesInfo": {
+                "courseId": course_id
+            }
+        },
+        "cloudPubsubTopic": {
+            "topicName": TOPIC_NAME
+        }
+    })
+
+
+def _delete_request(service, registration_id):
+    return service.registrations().delete(registrationId=registration_id)
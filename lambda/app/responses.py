@@ -0,0 +1,193 @@
+import logging
+import numbers
+import uuid
+
+from . import codec
+from .log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+STUDENT_PROFILE_NAMESPACE = "Alexa.Education.Profile.Student"
+COURSEWORK_NAMESPACE = "Alexa.Education.Coursework"
+ANNOUNCEMENTS_NAMESPACE = "Alexa.Education.School.Communication"
+COURSE_NAMESPACE = "Alexa.Education.Course"
+COURSE_WORK_GRADE_NAMESPACE = "Alexa.Education.Grade.Coursework"
+
+
+# One record type per namespace, holding only what varies between items.
+# The handlers collect records and build() turns them into the response in
+# one pass at the end, so no item is converted twice.
+class StudentProfile:
+    __slots__ = ("id", "given", "family", "full")
+
+    def __init__(self, id, given, family, full):
+        self.id = id
+        self.given = given
+        self.family = family
+        self.full = full
+
+    def as_json(self):
+        return {"id": self.id, "accountRelationType": "SELF",
+                "name": {"given": self.given, "family": self.family, "full": self.full}}
+
+
+class Course:
+    __slots__ = ("id", "name", "description")
+
+    def __init__(self, id, name, description):
+        self.id = id
+        self.name = name
+        self.description = description
+
+    def as_json(self):
+        return {"id": self.id, "name": self.name, "description": self.description}
+
+
+class Coursework:
+    __slots__ = ("id", "course_id", "course_name", "title", "description", "submission_state",
+                 "due_time", "published_time")
+
+    def __init__(self, id, course_id, course_name, title, description, submission_state,
+                 due_time, published_time):
+        self.id = id
+        self.course_id = course_id
+        self.course_name = course_name
+        self.title = title
+        self.description = description
+        self.submission_state = submission_state
+        self.due_time = due_time
+        self.published_time = published_time
+
+    def as_json(self):
+        return {"id": self.id, "courseId": self.course_id, "courseName": self.course_name,
+                "title": self.title, "description": self.description, "type": "ASSIGNMENT",
+                "submissionState": self.submission_state, "dueTime": self.due_time,
+                "publishedTime": self.published_time}
+
+
+class CourseworkGrade:
+    __slots__ = ("course_id", "course_name", "course_work_id", "title", "score", "max_points",
+                 "graded_time", "student_id")
+
+    def __init__(self, course_id, course_name, course_work_id, title, score, max_points,
+                 graded_time, student_id=None):
+        self.course_id = course_id
+        self.course_name = course_name
+        self.course_work_id = course_work_id
+        self.title = title
+        self.score = score
+        self.max_points = max_points
+        self.graded_time = graded_time
+        self.student_id = student_id
+
+    def as_json(self):
+        return {"courseworkId": self.course_work_id, "courseId": self.course_id,
+                "courseName": self.course_name, "studentId": self.student_id,
+                "courseworkType": "ASSIGNMENT", "courseworkTitle": self.title,
+                "grade": {"overallGrade": {"gradeScore": {
+                    "type": "POINTS", "score": self.score, "maxPoints": self.max_points}}},
+                "lastGradedTime": self.graded_time}
+
+
+class Announcement:
+    __slots__ = ("id", "sender", "text", "published_time")
+
+    def __init__(self, id, sender, text, published_time):
+        self.id = id
+        self.sender = sender
+        self.text = text
+        self.published_time = published_time
+
+    def as_json(self):
+        return {"id": self.id, "type": "GENERIC_FROM", "kind": "ANNOUNCEMENT",
+                "from": self.sender, "content": {"type": "PLAIN_TEXT", "text": self.text},
+                "publishedTime": self.published_time}
+
+
+# The payload list of each namespace and, for debug runs, the shape of its
+# items in the Alexa.Education schemas: a type (or tuple of types), a tuple
+# of allowed strings, or a nested shape
+_TEXT = str
+_NUMBER = numbers.Real
+_SHAPES = {
+    STUDENT_PROFILE_NAMESPACE: ("studentProfiles", {
+        "id": _TEXT, "accountRelationType": ("SELF", "GUARDIAN"),
+        "name": {"given": _TEXT, "family": _TEXT, "full": _TEXT}}),
+    COURSE_NAMESPACE: ("courses", {"id": _TEXT, "name": _TEXT, "description": _TEXT}),
+    COURSEWORK_NAMESPACE: ("coursework", {
+        "id": _TEXT, "courseId": _TEXT, "courseName": _TEXT, "title": _TEXT,
+        "description": _TEXT, "type": ("ASSIGNMENT", "QUIZ", "TEST", "PROJECT"),
+        "submissionState": ("SUBMITTED", "NOT_SUBMITTED", "MISSING"),
+        "dueTime": _TEXT, "publishedTime": _TEXT}),
+    COURSE_WORK_GRADE_NAMESPACE: ("courseworkGrades", {
+        "courseworkId": _TEXT, "courseId": _TEXT, "courseName": _TEXT, "studentId": _TEXT,
+        "courseworkType": ("ASSIGNMENT", "QUIZ", "TEST", "PROJECT"), "courseworkTitle": _TEXT,
+        "grade": {"overallGrade": {"gradeScore": {
+            "type": ("POINTS",), "score": _NUMBER, "maxPoints": _NUMBER}}},
+        "lastGradedTime": _TEXT}),
+    ANNOUNCEMENTS_NAMESPACE: ("schoolCommunications", {
+        "id": _TEXT, "type": ("GENERIC_FROM",), "kind": ("ANNOUNCEMENT",), "from": _TEXT,
+        "content": {"type": ("PLAIN_TEXT",), "text": _TEXT}, "publishedTime": _TEXT}),
+}
+
+
+def build(namespace, records):
+    items = [record.as_json() for record in records]
+    response = {
+        "response": {
+            "header": {
+                "namespace": namespace,
+                "name": "GetResponse",
+                "interfaceVersion": "1.0",
+                "messageId": str(uuid.uuid4())
+            },
+            "payload": {
+                "paginationContext": {
+                    "totalCount": len(items)
+                },
+                _SHAPES[namespace][0]: items
+            }
+        }
+    }
+    # Checking every item costs about as much as building it, so only
+    # debug runs do
+    if logger.isEnabledFor(logging.DEBUG):
+        validate(namespace, response)
+    return response
+
+
+def validate(namespace, response):
+    # Logs, rather than raises, what does not match the schema, so a debug
+    # run still answers
+    items_key, shape = _SHAPES[namespace]
+    problems = []
+    payload = response["response"]["payload"]
+    if payload["paginationContext"]["totalCount"] != len(payload[items_key]):
+        problems.append("paginationContext.totalCount")
+    for index, item in enumerate(payload[items_key]):
+        _check(item, shape, "{}[{}]".format(items_key, index), problems)
+    try:
+        codec.dumps(response)
+    except TypeError as e:
+        problems.append("not JSON: {}".format(e))
+    if problems:
+        log_fields(logger, "Response does not match its schema", logging.ERROR,
+                   namespace=namespace, problems=problems[:20], count=len(problems))
+    return problems
+
+
+def _check(value, shape, path, problems):
+    if isinstance(shape, dict):
+        if not isinstance(value, dict):
+            problems.append(path)
+            return
+        for key, expected in shape.items():
+            if key not in value:
+                problems.append("{}.{} missing".format(path, key))
+            else:
+                _check(value[key], expected, "{}.{}".format(path, key), problems)
+    elif isinstance(shape, tuple) and isinstance(shape[0], str):
+        if value not in shape:
+            problems.append("{} = {!r}".format(path, value))
+    elif isinstance(value, bool) or not isinstance(value, shape):
+        problems.append("{} = {!r}".format(path, value))
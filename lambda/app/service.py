@@ -0,0 +1,112 @@
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from urllib.parse import urljoin
+
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import Resource
+from googleapiclient.http import HttpRequest, build_http
+from googleapiclient.model import JsonModel
+from googleapiclient.schema import Schemas
+
+from .tracing import traced
+
+DISCOVERY_DOCUMENT_PATH = os.path.join(
+    os.path.dirname(__file__), "discovery", "classroom.v1.json")
+
+# Transports (and the TLS connections they hold) kept for the whole
+# container. At most HTTP_POOL_SIZE requests are in flight at once; one
+# idle for longer than HTTP_IDLE_TIMEOUT is replaced rather than reused,
+# since the server has likely closed its connection by then.
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "8"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+HTTP_IDLE_TIMEOUT = float(os.environ.get("HTTP_IDLE_TIMEOUT", "60"))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_discovery():
+    # Parsed once per container; every service built afterwards shares the
+    # same document, schemas and model.
+    with open(DISCOVERY_DOCUMENT_PATH) as f:
+        document = json.load(f)
+    # Points the client (batch endpoint included) at a local stand-in
+    if os.environ.get("CLASSROOM_API_ROOT"):
+        document['rootUrl'] = os.environ["CLASSROOM_API_ROOT"]
+    schema = Schemas(document)
+    model = JsonModel("dataWrapper" in document.get("features", []))
+    base_url = urljoin(document['rootUrl'], document['servicePath'])
+    return document, schema, model, base_url
+
+
+class PooledHttp:
+    # Stands in for httplib2.Http. Each request borrows an idle transport,
+    # open connections included, and hands it back when done, so one
+    # instance can be shared by threads and by every invocation of a warm
+    # container. Authorization is added per request by the AuthorizedHttp
+    # wrapping it.
+    def __init__(self, size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT, idle_timeout=HTTP_IDLE_TIMEOUT):
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(size)
+        # Most recently used first, so the warmest connections are reused
+        # and the rest age out
+        self._idle = queue.LifoQueue()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self._slots:
+            http = self._checkout()
+            try:
+                response = http.request(uri, method, body=body, headers=headers, **kwargs)
+            except Exception:
+                # The connection may be left mid-response, so the transport
+                # is dropped rather than returned
+                http.close()
+                raise
+            self._idle.put((time.monotonic(), http))
+            return response
+
+    def close(self):
+        while True:
+            try:
+                _, http = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            http.close()
+
+    def _checkout(self):
+        while True:
+            try:
+                last_used, http = self._idle.get_nowait()
+            except queue.Empty:
+                http = build_http()
+                http.timeout = self.timeout
+                return http
+            if time.monotonic() - last_used <= self.idle_timeout:
+                return http
+            http.close()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_http():
+    return PooledHttp()
+
+
+def authorized_http(creds):
+    return AuthorizedHttp(creds, http=shared_http())
+
+
+@traced("build")
+def get_service(creds):
+    document, schema, model, base_url = _load_discovery()
+    return Resource(
+        http=authorized_http(creds),
+        baseUrl=base_url,
+        model=model,
+        requestBuilder=HttpRequest,
+        developerKey=None,
+        resourceDesc=document,
+        rootDesc=document,
+        schema=schema)
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from . import codec, completeness, deadline, tracing
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# How long a leader may take before waiting containers give up on it and
+# fetch for themselves, how long its result is handed to late duplicates,
+# and how often they look for it.
+LOCK_SECONDS = int(os.environ.get("SINGLE_FLIGHT_LOCK_SECONDS", "10"))
+RESULT_SECONDS = int(os.environ.get("SINGLE_FLIGHT_RESULT_SECONDS", "5"))
+POLL_INTERVAL = float(os.environ.get("SINGLE_FLIGHT_POLL_INTERVAL", "0.1"))
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "incomplete")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.incomplete = []
+
+
+class SingleFlight:
+    # Collapses identical fetches that overlap in time into one. Within a
+    # container the first caller of a key runs the fetch and the others
+    # wait for its result (or its exception). Across containers, with a
+    # DynamoDB table configured, a conditional put elects one leader per
+    # key; the rest poll its record for the result, which it keeps for
+    # RESULT_SECONDS. Any DynamoDB failure falls back to fetching directly.
+    def __init__(self, model=None, lock_seconds=LOCK_SECONDS, result_seconds=RESULT_SECONDS,
+                 poll_interval=POLL_INTERVAL):
+        self.model = model
+        self.lock_seconds = lock_seconds
+        self.result_seconds = result_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    @staticmethod
+    def key(parts):
+        return json.dumps(parts, sort_keys=True)
+
+    def do(self, parts, fetch, *args, **kwargs):
+        flight_key = self.key(parts)
+        with self._lock:
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+        if not leader:
+            tracing.count("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # The leader's result is this caller's too, complete or not
+            for stage in call.incomplete:
+                completeness.mark(stage)
+            return call.value
+
+        try:
+            with completeness.scope() as scope:
+                call.value = self._shared_fetch(flight_key, fetch, args, kwargs)
+            call.incomplete = scope.stages
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[flight_key]
+            call.done.set()
+        return call.value
+
+    def _shared_fetch(self, flight_key, fetch, args, kwargs):
+        if self.model is None:
+            return fetch(*args, **kwargs)
+        from pynamodb.exceptions import PynamoDBException
+
+        owner = uuid.uuid4().hex
+        try:
+            acquired = self._acquire(flight_key, owner)
+        except PynamoDBException as e:
+            logger.warning("Single flight lock failed for {}: {}".format(flight_key, e))
+            return fetch(*args, **kwargs)
+        if not acquired:
+            value = self._wait(flight_key)
+            if value is not None:
+                tracing.count("coalesced")
+                return codec.loads(value)
+            return fetch(*args, **kwargs)
+
+        try:
+            value = fetch(*args, **kwargs)
+        except Exception:
+            self._release(flight_key, owner)
+            raise
+        if completeness.incomplete():
+            # Waiting containers fetch a complete result for themselves
+            self._release(flight_key, owner)
+            return value
+        try:
+            self.model(flight_key, owner=owner, payload=codec.dumps(value),
+                       expires_at=int(time.time()) + self.result_seconds).save()
+        except PynamoDBException as e:
+            logger.warning("Single flight result write failed for {}: {}".format(flight_key, e))
+        return value
+
+    def _acquire(self, flight_key, owner):
+        from pynamodb.exceptions import PutError
+
+        # An expired record (lock or result) is taken over; DynamoDB only
+        # sweeps them eventually
+        now = int(time.time())
+        try:
+            self.model(flight_key, owner=owner, expires_at=now + self.lock_seconds).save(
+                condition=self.model.flight_key.does_not_exist() | (self.model.expires_at <= now))
+        except PutError as e:
+            if e.cause_response_code == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def _wait(self, flight_key):
+        # The leader's result as JSON, or None once its lock is gone or has
+        # expired without one, or the invocation's deadline has come
+        from pynamodb.exceptions import PynamoDBException
+
+        give_up_at = time.monotonic() + self.lock_seconds
+        expires_at = deadline.expires_at()
+        if expires_at is not None:
+            give_up_at = min(give_up_at, expires_at)
+        while time.monotonic() < give_up_at:
+            try:
+                record = self.model.get(flight_key, consistent_read=True)
+            except self.model.DoesNotExist:
+                return None
+            except PynamoDBException as e:
+                logger.warning("Single flight read failed for {}: {}".format(flight_key, e))
+                return None
+            if record.expires_at <= time.time():
+                return None
+            if record.payload is not None:
+                return record.payload
+            time.sleep(self.poll_interval)
+        return None
+
+    def _release(self, flight_key, owner):
+        # Lets waiting containers stop polling and fetch for themselves
+        from pynamodb.exceptions import PynamoDBException
+        try:
+            self.model(flight_key).delete(condition=self.model.owner == owner)
+        except PynamoDBException as e:
+            logger.warning("Single flight release failed for {}: {}".format(flight_key, e))
+
+
+def _table_model():
+    if not os.environ.get("SINGLE_FLIGHT_TABLE"):
+        return None
+    from .tables import FlightRecord
+    return FlightRecord
+
+
+flights = SingleFlight(model=_table_model())
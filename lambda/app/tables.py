@@ -0,0 +1,67 @@
+import os
+
+from pynamodb.attributes import (
+    BooleanAttribute, ListAttribute, NumberAttribute, UnicodeAttribute)
+from pynamodb.exceptions import PynamoDBException  # noqa: F401
+from pynamodb.indexes import GlobalSecondaryIndex, KeysOnlyProjection
+from pynamodb.models import Model
+
+
+class CachedResponse(Model):
+    class Meta:
+        table_name = os.environ.get("RESPONSE_CACHE_TABLE", "ClassroomResponseCache")
+        region = "us-east-1"
+        host = os.environ.get("DYNAMODB_HOST")
+    cache_key = UnicodeAttribute(hash_key=True)
+    payload = UnicodeAttribute()
+    expires_at = NumberAttribute()
+
+
+class FlightRecord(Model):
+    # A single-flight lock while payload is null. Once the leader's fetch
+    # completes, payload holds its result for the followers until
+    # expires_at.
+    class Meta:
+        table_name = os.environ.get("SINGLE_FLIGHT_TABLE", "ClassroomSingleFlight")
+        region = "us-east-1"
+        host = os.environ.get("DYNAMODB_HOST")
+    flight_key = UnicodeAttribute(hash_key=True)
+    owner = UnicodeAttribute()
+    payload = UnicodeAttribute(null=True)
+    expires_at = NumberAttribute()
+
+
+class CourseIdIndex(GlobalSecondaryIndex):
+    class Meta:
+        index_name = "course_id-index"
+        projection = KeysOnlyProjection()
+        read_capacity_units = 5
+        write_capacity_units = 5
+    course_id = UnicodeAttribute(hash_key=True)
+
+
+class CourseworkIndexEntry(Model):
+    class Meta:
+        table_name = os.environ.get("COURSEWORK_INDEX_TABLE", "CourseworkIndex")
+        region = "us-east-1"
+        host = os.environ.get("DYNAMODB_HOST")
+    student_key = UnicodeAttribute(hash_key=True)
+    course_id = UnicodeAttribute(range_key=True)
+    course_works = UnicodeAttribute()
+    submissions = UnicodeAttribute()
+    refreshed_at = NumberAttribute()
+    stale = BooleanAttribute(default=False)
+    by_course = CourseIdIndex()
+
+
+class UserMapping(Model):
+    class Meta:
+        table_name = "UserMapping"
+        region = "us-east-1"
+        host = os.environ.get("DYNAMODB_HOST")
+    google_user_id = UnicodeAttribute(hash_key=True)
+    alexa_user_id = UnicodeAttribute()
+    registration_ids = ListAttribute()
+    # JSON object of course id -> {"registrationId", "expiryTime"}, so a
+    # later sync only touches the delta and renews what is about to expire
+    registrations = UnicodeAttribute(null=True)
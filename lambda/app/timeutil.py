@@ -0,0 +1,57 @@
+import datetime
+
+UTC = datetime.timezone.utc
+
+
+def parse(timestamp):
+    # Fixed-format path for "YYYY-MM-DDTHH:MM:SS[.fraction](Z|+HH:MM)",
+    # which is all the API and Alexa send. Anything else goes to dateutil.
+    if timestamp.endswith("Z"):
+        body, tzinfo = timestamp[:-1], UTC
+    elif len(timestamp) > 6 and timestamp[-6] in "+-" and timestamp[-3] == ":":
+        offset = datetime.timedelta(hours=int(timestamp[-5:-3]), minutes=int(timestamp[-2:]))
+        body = timestamp[:-6]
+        tzinfo = datetime.timezone(-offset if timestamp[-6] == "-" else offset)
+    else:
+        body, tzinfo = None, None
+    if body is not None and len(body) >= 19 and body[10] == "T":
+        fraction = body[20:]
+        try:
+            return datetime.datetime(
+                int(body[0:4]), int(body[5:7]), int(body[8:10]),
+                int(body[11:13]), int(body[14:16]), int(body[17:19]),
+                int(fraction[:6].ljust(6, "0")) if fraction else 0, tzinfo)
+        except ValueError:
+            pass
+    import dateutil.parser
+    return dateutil.parser.isoparse(timestamp)
+
+
+def timestamp_key(timestamp):
+    # API timestamps are UTC, end in "Z" and carry zero to nine fractional
+    # digits, so they order correctly as strings once the fraction is
+    # padded to a fixed width. Cheaper than parsing them.
+    return timestamp[:19] + timestamp[20:-1].ljust(9, "0")
+
+
+def datetime_key(value):
+    # The timestamp_key of an aware datetime, for computing a bound once
+    # and comparing raw API timestamps against it
+    value = value.astimezone(UTC)
+    return value.strftime("%Y-%m-%dT%H:%M:%S") + "{:06d}000".format(value.microsecond)
+
+
+def minute_key(year, month, day, hour=0, minute=0):
+    # Orders like the datetime it stands for, and `// 10000` is the date
+    return ((year * 100 + month) * 100 + day) * 10000 + hour * 100 + minute
+
+
+def datetime_minute_key(value, round_up=False):
+    value = value.astimezone(UTC)
+    if round_up and (value.second or value.microsecond):
+        value = value.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    return minute_key(value.year, value.month, value.day, value.hour, value.minute)
+
+
+def days_ago_key(days):
+    return datetime_key(datetime.datetime.now(UTC) - datetime.timedelta(days=days))
@@ -0,0 +1,156 @@
+import collections
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "GoogleClassroomSkill")
+
+# The Trace of the invocation running in this context, so concurrent
+# invocations in one process keep their spans apart. Worker threads record
+# into it by running in a copy of the submitting context.
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.main_thread = threading.get_ident()
+        self.spans = collections.OrderedDict()
+        self.counters = collections.Counter()
+        self._stacks = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def enter(self, name):
+        # A span opened inside another one, or on a worker thread while the
+        # main thread has a span open, is recorded as "parent/name" so that
+        # only top-level spans are summed against the total.
+        thread_id = threading.get_ident()
+        with self._lock:
+            stack = self._stacks[thread_id]
+            parent = stack[-1] if stack else None
+            if parent is None and thread_id != self.main_thread and self._stacks[self.main_thread]:
+                parent = self._stacks[self.main_thread][-1]
+            path = parent + "/" + name if parent else name
+            stack.append(path)
+        return path
+
+    def exit(self, path, elapsed):
+        with self._lock:
+            self._stacks[threading.get_ident()].pop()
+            total, calls = self.spans.get(path, (0.0, 0))
+            self.spans[path] = (total + elapsed, calls + 1)
+
+    def count(self, name, value):
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self):
+        total = (time.perf_counter() - self.started) * 1000
+        spans = {path: elapsed * 1000 for path, (elapsed, _) in self.spans.items()}
+        top_level = sum(ms for path, ms in spans.items() if "/" not in path)
+        return {
+            "handler": self.name,
+            "total": total,
+            "spans": spans,
+            "unaccounted": total - top_level,
+            "counts": dict(self.counters),
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "path", "started")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.path = self.trace.enter(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.trace.exit(self.path, time.perf_counter() - self.started)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name):
+    trace = _current.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Span(trace, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def begin(name):
+    _current.set(Trace(name) if TRACING_ENABLED else None)
+
+
+def finish():
+    trace = _current.get()
+    _current.set(None)
+    if trace is None:
+        return None
+    summary = trace.summary()
+    # Embedded Metric Format has to reach CloudWatch as a bare JSON line,
+    # so it bypasses the logging formatter.
+    print(json.dumps(_embedded_metrics(summary), separators=(",", ":")))
+    return summary
+
+
+def _embedded_metrics(summary):
+    values = {"total": summary["total"], "unaccounted": summary["unaccounted"]}
+    values.update(("span." + path, ms) for path, ms in summary["spans"].items())
+    counts = {"count." + name: value for name, value in summary["counts"].items()}
+    metrics = [{"Name": name, "Unit": "Milliseconds"} for name in values]
+    metrics += [{"Name": name, "Unit": "Count"} for name in counts]
+
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Handler"]],
+                "Metrics": metrics,
+            }],
+        },
+        "Handler": summary["handler"],
+    }
+    record.update(values)
+    record.update(counts)
+    return record